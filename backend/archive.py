@@ -0,0 +1,150 @@
+# backend/archive.py
+"""
+Hot/cold archival of handed-out tracks.
+
+Tracks handed out more than ARCHIVE_AFTER_DAYS ago are moved from `tracks`
+to `tracks_archive` in bounded batches (INSERT ... SELECT + DELETE, one
+transaction per batch), so the hot table and its indexes only hold parcels
+that are still moving. Their track_events stay where they are: tracks ids
+are never reused (on an older SQLite database run
+`python -m backend.migration_tracks_autoincrement` first).
+
+A daemon thread runs the archival every ARCHIVE_INTERVAL_SECONDS; set
+ARCHIVE_SCHEDULER=0 to disable it (e.g. on all but one worker) and run
+`python -m backend.archive` from cron instead. It does not start on an
+in-memory database, where it would share the requests' connection.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from backend import db, statuses
+from backend.cache import invalidate_tracks
+from backend.models import Track, TrackArchive
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", str(6 * 3600)))
+ARCHIVE_SCHEDULER = os.getenv("ARCHIVE_SCHEDULER", "1") == "1"
+
+# Every tracks column has a same-named tracks_archive column
+TRACK_COLUMNS = [column.name for column in Track.__table__.columns]
+
+_stop = threading.Event()
+_thread = None
+
+
+def _check_ids_not_reused(session: Session):
+    if session.get_bind().dialect.name != "sqlite":
+        return
+    from backend.migration_tracks_autoincrement import needs_rebuild
+    if needs_rebuild(session.connection()):
+        raise RuntimeError(
+            "tracks ids can be reused on this SQLite database, "
+            "run python -m backend.migration_tracks_autoincrement first"
+        )
+
+
+def _move(session: Session, ids: list) -> int:
+    """Copy the given tracks to the archive and delete them, in the caller's transaction."""
+    _check_ids_not_reused(session)
+    session.execute(insert(TrackArchive).from_select(
+        TRACK_COLUMNS,
+        select(*(Track.__table__.c[name] for name in TRACK_COLUMNS)).where(Track.id.in_(ids))
+    ))
+    return session.execute(
+        delete(Track).where(Track.id.in_(ids)).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def archive_tracks(session: Session, track_ids: list) -> int:
+    """Move specific tracks to the archive now. Returns the number moved."""
+    numbers = list(session.execute(select(Track.track_number).where(Track.id.in_(track_ids))).scalars())
+    if not numbers:
+        return 0
+    moved = _move(session, track_ids)
+    session.commit()
+    invalidate_tracks(numbers)
+    return moved
+
+
+def archive_handed_out(session: Session, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                       batch_size: int = ARCHIVE_BATCH_SIZE, max_batches: int = None) -> int:
+    """
+    Move tracks handed out more than `older_than_days` ago, `batch_size` at a
+    time, each batch committed on its own. Returns the number of tracks moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = session.execute(
+            select(Track.id, Track.track_number)
+            .where(
+                Track.status_code == statuses.DELIVERED,
+                # Delivered via a batch status update leaves handout_date empty
+                func.coalesce(Track.handout_date, Track.updated_at) < cutoff
+            )
+            .order_by(Track.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        try:
+            moved += _move(session, [row.id for row in rows])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        invalidate_tracks(row.track_number for row in rows)
+        batches += 1
+    if moved:
+        print(f"📦 [ARCHIVE] Moved {moved} handed-out tracks to tracks_archive")
+    return moved
+
+
+# ==============================
+# Scheduler
+# ==============================
+def run_once() -> int:
+    session = db.SessionLocal()
+    try:
+        return archive_handed_out(session)
+    finally:
+        session.close()
+
+
+def _loop():
+    while not _stop.wait(ARCHIVE_INTERVAL_SECONDS):
+        try:
+            run_once()
+        except Exception as e:
+            print(f"❌ [ARCHIVE] Run failed: {e}")
+
+
+def start_scheduler():
+    """Start the periodic archival thread (no-op if disabled or already running)."""
+    global _thread
+    if not ARCHIVE_SCHEDULER or (_thread and _thread.is_alive()):
+        return
+    if db.SHARED_CONNECTION:
+        print("📦 [ARCHIVE] Scheduler off: in-memory database, one shared connection")
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="track-archiver", daemon=True)
+    _thread.start()
+    print(f"📦 [ARCHIVE] Scheduler started: every {ARCHIVE_INTERVAL_SECONDS}s, after {ARCHIVE_AFTER_DAYS} days")
+
+
+def stop_scheduler():
+    _stop.set()
+    if _thread:
+        _thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    print(f"Archived {run_once()} tracks")
@@ -0,0 +1,313 @@
+# backend/audit_files.py
+"""
+Day segments of old audit logs on disk.
+
+The retention job moves audit_logs entries older than AUDIT_RETENTION_DAYS
+out of the database into gzip-compressed JSONL files, one per day:
+
+    AUDIT_SEGMENT_DIR/2024/03/audit-2024-03-01.jsonl.gz
+
+A day is written from its DB rows (all workers' entries, sync and queued),
+fsynced and renamed into place, and only then deleted from audit_logs in
+batches. Entries that show up for an already sealed day later go to an
+extra part (audit-2024-03-01.2.jsonl.gz). index.json lists the parts per
+day and `sealed_through`, the last day that lives in files: days up to it
+are read from segments, later days from the database. Readers drop
+duplicate ids, so a run interrupted between writing and deleting is safe
+to repeat. The job reads and deletes through a session of its own.
+
+Segments have no full-text index: q= searches them with text_predicate(),
+a plain case-insensitive word match, one day file at a time.
+
+The daily counters in audit_daily_stats are left alone, so /api/audit/stats
+keeps covering the whole history.
+
+The job runs every AUDIT_RETENTION_INTERVAL_SECONDS when
+AUDIT_RETENTION_SCHEDULER=1 (off by default: put AUDIT_SEGMENT_DIR on
+persistent storage first; never on an in-memory database), or from cron:
+`python -m backend.audit_files`.
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Query, Session
+
+from backend import db
+from backend.models import AuditLog
+
+AUDIT_SEGMENT_DIR = os.getenv("AUDIT_SEGMENT_DIR", "./audit_segments")
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "180"))
+AUDIT_RETENTION_BATCH_SIZE = int(os.getenv("AUDIT_RETENTION_BATCH_SIZE", "5000"))
+AUDIT_RETENTION_INTERVAL_SECONDS = int(os.getenv("AUDIT_RETENTION_INTERVAL_SECONDS", str(6 * 3600)))
+AUDIT_RETENTION_SCHEDULER = os.getenv("AUDIT_RETENTION_SCHEDULER", "0") == "1"
+
+INDEX_FILE = "index.json"
+
+# One record per entry, also the row format of /api/audit/export
+COLUMNS = [
+    AuditLog.id, AuditLog.timestamp, AuditLog.action, AuditLog.performed_by,
+    AuditLog.target_entity, AuditLog.target_id, AuditLog.warehouse, AuditLog.warehouse_id,
+    AuditLog.track_number, AuditLog.count, AuditLog.ip_address, AuditLog.details,
+]
+FIELDS = [column.key for column in COLUMNS]
+
+_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+
+
+def to_record(row) -> dict:
+    record = dict(zip(FIELDS, row))
+    record["timestamp"] = row.timestamp.isoformat() if row.timestamp else None
+    return record
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+# ==============================
+# Index
+# ==============================
+def load_index() -> dict:
+    path = os.path.join(AUDIT_SEGMENT_DIR, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"sealed_through": None, "days": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(index: dict):
+    path = os.path.join(AUDIT_SEGMENT_DIR, INDEX_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def sealed_through():
+    """Last day whose entries live in segment files, None if there are none."""
+    value = load_index()["sealed_through"]
+    return date.fromisoformat(value) if value else None
+
+
+def live(query: Query) -> Query:
+    """Restrict an AuditLog query to the days still served from the database."""
+    sealed = sealed_through()
+    if not sealed:
+        return query
+    return query.filter(AuditLog.timestamp >= day_start(sealed + timedelta(days=1)))
+
+
+# ==============================
+# Reading
+# ==============================
+def read_day(day: date, index: dict = None) -> list:
+    """All records of one sealed day, oldest first, without duplicates."""
+    index = index or load_index()
+    records = {}
+    for part in index["days"].get(day.isoformat(), {}).get("parts", []):
+        with gzip.open(os.path.join(AUDIT_SEGMENT_DIR, part), "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                records[record["id"]] = record
+    return sorted(records.values(), key=lambda r: (r["timestamp"], r["id"]))
+
+
+def _days(index: dict, date_from: datetime = None, date_to: datetime = None, descending: bool = False) -> list:
+    days = sorted(index["days"], reverse=descending)
+    return [
+        date.fromisoformat(day) for day in days
+        if (date_from is None or day >= date_from.date().isoformat())
+        and (date_to is None or day <= date_to.date().isoformat())
+    ]
+
+
+def iter_records(date_from: datetime = None, date_to: datetime = None):
+    """Records with date_from <= timestamp < date_to from the segments, oldest first."""
+    index = load_index()
+    for day in _days(index, date_from, date_to):
+        for record in read_day(day, index):
+            timestamp = datetime.fromisoformat(record["timestamp"])
+            if (date_from is None or timestamp >= date_from) and (date_to is None or timestamp < date_to):
+                yield record
+
+
+def _words(value: str) -> set:
+    return set(re.findall(r"\w+", value.casefold()))
+
+
+def text_predicate(q: str):
+    """Record filter for a full-text query over segments: every word of `q` occurs in the entry."""
+    wanted = _words(q)
+
+    def match(record: dict) -> bool:
+        details = json.dumps(record["details"], ensure_ascii=False) if record["details"] else ""
+        found = _words(" ".join(
+            str(record[field] or "") for field in ("action", "performed_by", "target_id")
+        ) + " " + details)
+        return wanted <= found
+    return match
+
+
+def page(date_from: datetime = None, date_to: datetime = None, before: tuple = None,
+         limit: int = 100, predicate=None):
+    """
+    Newest-first page of segment records with date_from <= timestamp <= date_to,
+    strictly before the (timestamp, id) key `before`, that pass `predicate`.
+    Reads one day file at a time and stops once the page is full.
+    Returns (records, more).
+    """
+    index = load_index()
+    if before:
+        date_to = min(date_to, before[0]) if date_to else before[0]
+    found = []
+    for day in _days(index, date_from, date_to, descending=True):
+        for record in reversed(read_day(day, index)):
+            key = (datetime.fromisoformat(record["timestamp"]), record["id"])
+            if before and key >= before:
+                continue
+            if (date_from and key[0] < date_from) or (date_to and key[0] > date_to):
+                continue
+            if predicate and not predicate(record):
+                continue
+            if len(found) == limit:
+                return found, True
+            found.append(record)
+    return found, False
+
+
+# ==============================
+# Retention
+# ==============================
+def _write_part(session: Session, day: date, index: dict):
+    """Write the DB rows of `day` to a new part file. Returns (count, max_id)."""
+    entry = index["days"].setdefault(day.isoformat(), {"parts": [], "count": 0})
+    suffix = f".{len(entry['parts']) + 1}" if entry["parts"] else ""
+    part = f"{day:%Y/%m}/audit-{day.isoformat()}{suffix}.jsonl.gz"
+    path = os.path.join(AUDIT_SEGMENT_DIR, part)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = session.execute(
+        select(*COLUMNS)
+        .where(AuditLog.timestamp >= day_start(day), AuditLog.timestamp < day_start(day + timedelta(days=1)))
+        .order_by(AuditLog.id)
+        .execution_options(yield_per=AUDIT_RETENTION_BATCH_SIZE)
+    )
+    count = 0
+    max_id = 0
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for row in rows:
+                f.write((json.dumps(to_record(row), ensure_ascii=False) + "\n").encode("utf-8"))
+                count += 1
+                max_id = row.id
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+
+    entry["parts"].append(part)
+    entry["count"] += count
+    return count, max_id
+
+
+def _delete_day(session: Session, day: date, max_id: int):
+    """Delete the rows of `day` up to `max_id` (what was written), one batch per transaction."""
+    while True:
+        ids = list(session.execute(
+            select(AuditLog.id)
+            .where(
+                AuditLog.timestamp >= day_start(day),
+                AuditLog.timestamp < day_start(day + timedelta(days=1)),
+                AuditLog.id <= max_id
+            )
+            .limit(AUDIT_RETENTION_BATCH_SIZE)
+        ).scalars())
+        if not ids:
+            return
+        session.execute(delete(AuditLog).where(AuditLog.id.in_(ids)).execution_options(synchronize_session=False))
+        session.commit()
+
+
+def seal_old_logs(older_than_days: int = AUDIT_RETENTION_DAYS) -> int:
+    """
+    Move entries older than `older_than_days` (whole days) from audit_logs
+    to day segments, oldest day first. Returns the number of entries moved.
+    Runs in a session of its own: its commits and rollbacks never touch a
+    request's transaction.
+    """
+    cutoff = day_start(datetime.utcnow().date() - timedelta(days=older_than_days))
+    moved = 0
+    session = db.SessionLocal()
+    try:
+        with _lock:
+            index = load_index()
+            while True:
+                oldest = session.execute(
+                    select(func.min(AuditLog.timestamp)).where(AuditLog.timestamp < cutoff)
+                ).scalar()
+                if oldest is None:
+                    break
+                day = oldest.date()
+                count, max_id = _write_part(session, day, index)
+                session.rollback()  # end the read transaction before deleting
+                sealed = index["sealed_through"]
+                if not sealed or day.isoformat() > sealed:
+                    index["sealed_through"] = day.isoformat()
+                _save_index(index)  # the file is on disk before its rows go
+                _delete_day(session, day, max_id)
+                moved += count
+    finally:
+        session.close()
+    if moved:
+        print(f"📦 [AUDIT] Moved {moved} audit entries older than {older_than_days} days to {AUDIT_SEGMENT_DIR}")
+    return moved
+
+
+# ==============================
+# Scheduler
+# ==============================
+def run_once() -> int:
+    return seal_old_logs()
+
+
+def _loop():
+    while not _stop.wait(AUDIT_RETENTION_INTERVAL_SECONDS):
+        try:
+            run_once()
+        except Exception as e:
+            print(f"❌ [AUDIT] Retention run failed: {e}")
+
+
+def start_scheduler():
+    """Start the periodic retention thread (no-op if disabled or already running)."""
+    global _thread
+    if not AUDIT_RETENTION_SCHEDULER or (_thread and _thread.is_alive()):
+        return
+    if db.SHARED_CONNECTION:
+        print("📦 [AUDIT] Retention scheduler off: in-memory database, one shared connection")
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="audit-retention", daemon=True)
+    _thread.start()
+    print(f"📦 [AUDIT] Retention started: every {AUDIT_RETENTION_INTERVAL_SECONDS}s, "
+          f"keeping {AUDIT_RETENTION_DAYS} days in the database")
+
+
+def stop_scheduler():
+    _stop.set()
+    if _thread:
+        _thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    print(f"Moved {run_once()} audit entries to {AUDIT_SEGMENT_DIR}")
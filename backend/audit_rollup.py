@@ -0,0 +1,128 @@
+# backend/audit_rollup.py
+"""
+Daily audit counters.
+
+Every audit entry bumps audit_daily_stats (day, action, performed_by) in the
+same transaction that inserts it (audit_sink.add / audit_sink.write), so
+/api/audit/stats sums a few rows per day instead of grouping the whole
+audit_logs table. rebuild() recomputes the counters from audit_logs, for the
+migration or after a manual cleanup.
+"""
+
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from backend.models import AuditDailyStat, AuditLog
+
+KEY_COLUMNS = ["day", "action", "performed_by"]
+REBUILD_BATCH_SIZE = 5000
+
+
+def _upsert(session: Session):
+    """INSERT ... ON CONFLICT (day, action, performed_by) DO UPDATE count = count + new count."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(AuditDailyStat)
+    return stmt.on_conflict_do_update(
+        index_elements=KEY_COLUMNS,
+        set_={"count": AuditDailyStat.count + stmt.excluded.count}
+    )
+
+
+def add_counts(session: Session, counts: Counter):
+    """Add {(day, action, performed_by): n} to the counters, in the caller's transaction."""
+    if not counts:
+        return
+    # Fixed key order, so two writers never lock the same rows in opposite order
+    rows = [
+        {"day": day, "action": action, "performed_by": performed_by, "count": n}
+        for (day, action, performed_by), n in sorted(counts.items())
+    ]
+    stmt = _upsert(session)
+    if stmt is not None:
+        session.execute(stmt, rows)
+        return
+    for row in rows:
+        bumped = session.execute(
+            update(AuditDailyStat)
+            .where(*(getattr(AuditDailyStat, key) == row[key] for key in KEY_COLUMNS))
+            .values(count=AuditDailyStat.count + row["count"])
+        ).rowcount
+        if not bumped:
+            session.execute(insert(AuditDailyStat).values(**row))
+
+
+def bump(session: Session, entries: list):
+    """Count audit entries (audit_sink.build_entry dicts) into the counters."""
+    add_counts(session, Counter(
+        (entry["timestamp"].date(), entry["action"], entry["performed_by"]) for entry in entries
+    ))
+
+
+def rebuild(session: Session, date_from: date = None, date_to: date = None) -> int:
+    """
+    Recompute the counters for [date_from, date_to] (everything by default)
+    from audit_logs, reading it in keyset batches. Commits. Returns entries counted.
+    """
+    stats = delete(AuditDailyStat)
+    logs = select(AuditLog.id, AuditLog.timestamp, AuditLog.action, AuditLog.performed_by) \
+        .where(AuditLog.timestamp.is_not(None))
+    if date_from:
+        stats = stats.where(AuditDailyStat.day >= date_from)
+        logs = logs.where(AuditLog.timestamp >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        stats = stats.where(AuditDailyStat.day <= date_to)
+        logs = logs.where(AuditLog.timestamp < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    session.execute(stats)
+
+    counts = Counter()
+    last_id = 0
+    total = 0
+    while True:
+        rows = session.execute(logs.where(AuditLog.id > last_id).order_by(AuditLog.id).limit(REBUILD_BATCH_SIZE)).all()
+        if not rows:
+            break
+        counts.update((row.timestamp.date(), row.action, row.performed_by) for row in rows)
+        last_id = rows[-1].id
+        total += len(rows)
+    add_counts(session, counts)
+    session.commit()
+    return total
+
+
+def get_stats(session: Session, date_from: date = None, date_to: date = None, top_users: int = 10) -> dict:
+    """Totals, per-action, per-day and most active users for a day range, from the counters only."""
+    conditions = []
+    if date_from:
+        conditions.append(AuditDailyStat.day >= date_from)
+    if date_to:
+        conditions.append(AuditDailyStat.day <= date_to)
+
+    total = func.sum(AuditDailyStat.count).label("total")
+    actions = session.execute(
+        select(AuditDailyStat.action, total).where(*conditions)
+        .group_by(AuditDailyStat.action).order_by(total.desc())
+    ).all()
+    users = session.execute(
+        select(AuditDailyStat.performed_by, total).where(*conditions)
+        .group_by(AuditDailyStat.performed_by).order_by(total.desc()).limit(top_users)
+    ).all()
+    days = session.execute(
+        select(AuditDailyStat.day, total).where(*conditions)
+        .group_by(AuditDailyStat.day).order_by(AuditDailyStat.day)
+    ).all()
+
+    return {
+        "total_logs": sum(count for _, count in actions),
+        "actions": [{"action": action, "count": count} for action, count in actions],
+        "most_active_users": [{"email": email, "actions": count} for email, count in users],
+        "by_day": [{"day": day.isoformat(), "count": count} for day, count in days],
+    }
@@ -0,0 +1,108 @@
+# backend/audit_search.py
+"""
+Full-text search over audit logs (q= on /api/audit/logs).
+
+SQLite: an external-content FTS5 table, audit_logs_fts, over action,
+performed_by, target_id and the details JSON text. Triggers on audit_logs
+keep it in step with every insert/update/delete, whichever code path writes.
+
+PostgreSQL: a generated tsvector column, audit_logs.search_tsv ('simple'
+config, so track numbers, emails and phone digits stay whole tokens), with
+a GIN index. Postgres computes it on insert.
+
+Either way q is a list of words, all required, with no operator syntax:
+FTS5 gets every word quoted, Postgres gets plainto_tsquery.
+
+ensure_index() creates whatever is missing and runs at startup. On a large
+existing table, run `python -m backend.migration_add_audit_fulltext` first:
+building the index reads every row, and on SQLite the migration also
+rewrites details stored with \\uXXXX escapes (rows written before
+db._json_serializer), which the index would otherwise not find by their
+Cyrillic words. Postgres keeps details as JSONB (migration_audit_details_json),
+whose text form has no escapes.
+"""
+
+from sqlalchemy import Float, Integer, func, literal_column, text
+from sqlalchemy.orm import Query
+
+from backend.models import AuditLog
+
+FTS_TABLE = "audit_logs_fts"
+TSV_COLUMN = "search_tsv"
+TSV_INDEX = "ix_audit_logs_search_tsv"
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        action, performed_by, target_id, details,
+        content='audit_logs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS audit_logs_fts_ai AFTER INSERT ON audit_logs BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, action, performed_by, target_id, details)
+        VALUES (new.id, new.action, new.performed_by, new.target_id, new.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS audit_logs_fts_ad AFTER DELETE ON audit_logs BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, action, performed_by, target_id, details)
+        VALUES ('delete', old.id, old.action, old.performed_by, old.target_id, old.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS audit_logs_fts_au AFTER UPDATE ON audit_logs BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, action, performed_by, target_id, details)
+        VALUES ('delete', old.id, old.action, old.performed_by, old.target_id, old.details);
+        INSERT INTO {FTS_TABLE} (rowid, action, performed_by, target_id, details)
+        VALUES (new.id, new.action, new.performed_by, new.target_id, new.details);
+    END""",
+]
+
+POSTGRES_DDL = [
+    f"""ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS {TSV_COLUMN} tsvector GENERATED ALWAYS AS (
+        to_tsvector('simple',
+            coalesce(action, '') || ' ' || coalesce(performed_by, '') || ' ' ||
+            coalesce(target_id, '') || ' ' || coalesce(details::text, ''))
+    ) STORED""",
+    f"CREATE INDEX IF NOT EXISTS {TSV_INDEX} ON audit_logs USING GIN ({TSV_COLUMN})",
+]
+
+
+def ensure_index(engine) -> bool:
+    """Create the full-text index if missing. Returns True if it was just created (and filled)."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            exists = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'audit_logs' AND column_name = :name"
+            ), {"name": TSV_COLUMN}).first()
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+            return not exists
+
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {"name": FTS_TABLE}).first()
+        for statement in SQLITE_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            # Index the rows written before the table existed
+            conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+        return not exists
+
+
+def fts5_query(q: str) -> str:
+    """User input -> FTS5 query: every word quoted (no operator syntax), all required."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in q.split())
+
+
+def ranked(query: Query, q: str) -> Query:
+    """Restrict an AuditLog query to entries matching `q`, best match first, newest among equals."""
+    dialect = query.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        document = literal_column(f"audit_logs.{TSV_COLUMN}")
+        tsquery = func.plainto_tsquery("simple", q)
+        return query.filter(document.op("@@")(tsquery)).order_by(
+            func.ts_rank_cd(document, tsquery).desc(), AuditLog.timestamp.desc(), AuditLog.id.desc()
+        )
+
+    # FTS5: rank is bm25, lower is better
+    matches = text(
+        f"SELECT rowid AS id, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+    ).bindparams(match=fts5_query(q)).columns(id=Integer, rank=Float).subquery("fts")
+    return query.join(matches, matches.c.id == AuditLog.id).order_by(
+        matches.c.rank, AuditLog.timestamp.desc(), AuditLog.id.desc()
+    )
@@ -0,0 +1,200 @@
+# backend/audit_sink.py
+"""
+Background audit log writer.
+
+AuditLogger.log_action / crud.log_action hand their entry to a bounded
+in-process queue instead of committing inside the request. A writer thread
+drains it and inserts up to AUDIT_BATCH_SIZE rows per multi-row INSERT,
+waiting at most AUDIT_FLUSH_INTERVAL_MS for a batch to fill, so a burst of
+admin actions costs one commit instead of one per entry.
+
+Entries are written synchronously in the request (as before) when:
+  - the action is in SYNC_ACTIONS or the caller passes sync=True
+    (compliance-critical: committed before the response goes out);
+  - the writer is not running or the queue is full.
+
+The writer commits on a pooled connection of its own, never inside a
+request's transaction. On an in-memory database (db.SHARED_CONNECTION) all
+sessions share one connection, so the writer does not start there and every
+entry is written in the request. AUDIT_ASYNC=0 disables it elsewhere.
+Queued entries are flushed on shutdown; an entry still in the queue when
+the process is killed is lost.
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from backend import audit_rollup, db
+from backend.models import AuditLog
+
+AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "1") == "1"
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+
+# Always committed in the request. Extend with AUDIT_SYNC_ACTIONS=A,B,C
+SYNC_ACTIONS = {
+    "LOGIN_FAILED",
+    "CREATE_USER",
+    "DELETE_USER",
+    "CHANGE_USER_ROLE",
+    "DELETE_TRACK",
+    "BATCH_DELETE",
+    "DELETE_WAREHOUSE",
+    "ARCHIVE_TRACKS",
+} | {a.strip() for a in os.getenv("AUDIT_SYNC_ACTIONS", "").split(",") if a.strip()}
+
+_queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+_STOP = object()
+_thread = None
+_running = False
+
+
+def build_entry(action: str, performed_by: str, target_entity: str = None, target_id=None,
+                details: dict = None, ip_address: str = None) -> dict:
+    """AuditLog column values for one entry, timestamped now (not at flush time)."""
+    return {
+        "action": action,
+        "performed_by": performed_by,
+        "target_entity": target_entity,
+        "target_id": str(target_id) if target_id else None,
+        "details": details or None,
+        "ip_address": ip_address,
+        "timestamp": datetime.utcnow(),
+    }
+
+
+def submit(entry: dict, sync: bool = False) -> bool:
+    """
+    Queue an entry for the writer. Returns False if it was not queued and
+    the caller has to write it itself.
+    """
+    if sync or not _running or entry["action"] in SYNC_ACTIONS:
+        return False
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        print("⚠️ [AUDIT] Queue full, writing synchronously")
+        return False
+    return True
+
+
+def add(session, entry: dict) -> AuditLog:
+    """Add one entry to the session (the synchronous path). The caller commits."""
+    from backend.logger import audit_columns
+    log = AuditLog(**entry, **audit_columns(session, entry["target_entity"], entry["target_id"], entry["details"]))
+    session.add(log)
+    audit_rollup.bump(session, [entry])
+    return log
+
+
+def write(session, entries: list):
+    """Insert entries (build_entry dicts) with one multi-row INSERT and commit."""
+    from backend.logger import audit_columns
+    rows = [
+        dict(entry, **audit_columns(session, entry["target_entity"], entry["target_id"], entry["details"]))
+        for entry in entries
+    ]
+    session.execute(insert(AuditLog), rows)
+    audit_rollup.bump(session, entries)
+    session.commit()
+
+
+def _write_batch(session, batch: list):
+    try:
+        write(session, batch)
+        return
+    except Exception as e:
+        session.rollback()
+        print(f"❌ [AUDIT] Batch of {len(batch)} failed: {e}, retrying one by one")
+    # One bad entry must not take the rest of the batch with it
+    for entry in batch:
+        try:
+            write(session, [entry])
+        except Exception as e:
+            session.rollback()
+            print(f"❌ [AUDIT] Dropped {entry['action']} by {entry['performed_by']}: {e}")
+
+
+def _loop():
+    interval = AUDIT_FLUSH_INTERVAL_MS / 1000
+    session = db.SessionLocal()
+    try:
+        while True:
+            item = _queue.get()
+            stopping = item is _STOP
+            batch = [] if stopping else [item]
+            deadline = time.monotonic() + interval
+            while not stopping and len(batch) < AUDIT_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = _queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if batch:
+                _write_batch(session, batch)
+            for _ in range(len(batch) + stopping):
+                _queue.task_done()
+            if stopping:
+                return
+    finally:
+        session.close()
+
+
+def start_writer():
+    """Start the writer thread (no-op if disabled or already running)."""
+    global _thread, _running
+    if not AUDIT_ASYNC or (_thread and _thread.is_alive()):
+        return
+    if db.SHARED_CONNECTION:
+        print("📋 [AUDIT] Writer off: in-memory database, writing in the request")
+        return
+    _thread = threading.Thread(target=_loop, name="audit-writer", daemon=True)
+    _thread.start()
+    _running = True
+    print(f"📋 [AUDIT] Writer started: batches of {AUDIT_BATCH_SIZE}, every {AUDIT_FLUSH_INTERVAL_MS}ms")
+
+
+def flush():
+    """Block until everything queued so far is written."""
+    if _running:
+        _queue.join()
+
+
+def stop_writer(timeout: float = 10):
+    """Write out the queue and stop the thread. Later entries are written synchronously."""
+    global _running
+    if not _running:
+        return
+    _running = False
+    _queue.put(_STOP)
+    _thread.join(timeout=timeout)
+
+    # Anything queued after the stop marker
+    leftover = []
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            break
+        _queue.task_done()
+        if item is not _STOP:
+            leftover.append(item)
+    if leftover:
+        session = db.SessionLocal()
+        try:
+            _write_batch(session, leftover)
+        finally:
+            session.close()
+    print("📋 [AUDIT] Writer stopped")
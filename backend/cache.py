@@ -0,0 +1,159 @@
+# backend/cache.py
+"""
+In-process read-through caches.
+
+Each worker process keeps its own copy, so every write path that touches
+the cached rows must invalidate explicitly; the TTL bounds how stale another
+worker's copy can get.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()  # returned by get() on a miss, None is a valid cached value
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> lock held by the caller computing it
+        self.generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        """Return the cached value or `default` if absent or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached value, or compute() and cache it. Concurrent misses on the same
+        key wait for the first caller's result instead of computing it again
+        (single-flight). A value whose compute() overlapped an invalidation
+        is returned but not cached: it may predate the write.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        with self._lock:
+            flight = self._flights.setdefault(key, threading.Lock())
+        try:
+            with flight:
+                value = self.get(key)
+                if value is MISSING:
+                    generation = self.generation
+                    value = compute()
+                    with self._lock:
+                        if self.generation == generation:
+                            self._store(key, value)
+                return value
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def invalidate_many(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# ==============================
+# Track search cache
+# ==============================
+# Keyed by normalized track number, value is the /api/tracks/search payload
+# (None for "not found", so repeated misses don't hit the DB either).
+track_cache = TTLCache(
+    maxsize=int(os.getenv("TRACK_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TRACK_CACHE_TTL", "300"))
+)
+
+
+def track_key(track_number: str) -> str:
+    """Normalize a track number the same way lookups do."""
+    return (track_number or "").strip().upper()
+
+
+def invalidate_tracks(track_numbers=None):
+    """
+    Drop cached tracks. With no argument the whole cache is cleared.
+    Bulk invalidations (everything, or more than one track) also drop the
+    cached /api/stats counters.
+    """
+    if track_numbers is None:
+        track_cache.clear()
+        invalidate_stats()
+        return
+    keys = [track_key(tn) for tn in track_numbers]
+    track_cache.invalidate_many(keys)
+    if len(keys) > 1:
+        invalidate_stats()
+
+
+# ==============================
+# Dashboard stats cache
+# ==============================
+# One entry: the /api/stats counters. Short TTL, every open admin tab polls it.
+stats_cache = TTLCache(maxsize=1, ttl=float(os.getenv("STATS_CACHE_TTL", "15")))
+
+
+def cached_stats(compute):
+    """The /api/stats payload, computed at most once per TTL across concurrent requests."""
+    return stats_cache.get_or_compute("stats", compute)
+
+
+def invalidate_stats():
+    stats_cache.clear()
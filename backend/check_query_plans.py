@@ -0,0 +1,189 @@
+# check_query_plans.py
+"""
+EXPLAIN check for the hot queries.
+
+Builds the schema from models.py in a scratch database, seeds it, runs
+EXPLAIN (QUERY PLAN) on every query below and exits with status 1 if any of
+them reads a whole table or sorts instead of walking an index.
+
+    python -m backend.check_query_plans
+    PLAN_CHECK_DATABASE_URL=postgresql://.../scratch python -m backend.check_query_plans
+
+Defaults to in-memory SQLite. On Postgres the seed data is rolled back, but
+use a scratch database anyway.
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, text, tuple_
+
+from backend.db import Base
+from backend.models import Track, TrackStatus, TrackEvent, AuditLog
+from backend import statuses
+from backend.crud import statistics_query
+
+SEED_TRACKS = 5000
+SEED_LOGS = 5000
+
+OTHER_STATUSES = [code for code in statuses.DEFAULT_STATUSES if code != statuses.DELIVERED]
+ACTIONS = ["LOGIN", "UPLOAD_TRACKS", "UPDATE_STATUS", "RECEIVE_PARCEL", "HANDOUT_PARCEL", "TRANSFER_PARCEL"]
+
+NOW = datetime(2024, 6, 1)
+
+
+def keyset(stmt, timestamp=datetime(2024, 5, 1), log_id=2500):
+    """An audit query's page after the cursor (timestamp, log_id), as logger.keyset_page builds it."""
+    return (stmt.where(tuple_(AuditLog.timestamp, AuditLog.id) < (timestamp, log_id))
+            .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(101))
+
+
+def hot_queries():
+    """
+    (name, statement, listing) tuples mirroring the filters used in main.py /
+    crud.py / logger.py. `listing` queries have no filter and may walk an
+    index in order; every other query must seek into one.
+    """
+    day = datetime(2024, 5, 10)
+    return [
+        ("client portal: tracks by personal code",
+         select(Track).where(Track.personal_code == "1005", Track.is_active == False)),
+        # One aggregate over all of tracks by design: must read an index, not the table
+        ("stats: /api/stats counters",
+         statistics_query(), True),
+        ("tracks/all: newest first",
+         select(Track).order_by(Track.created_at.desc()).limit(100), True),
+        ("track timeline",
+         select(TrackEvent).where(TrackEvent.track_id == 1234).order_by(TrackEvent.ts)),
+        ("track search by number",
+         select(Track).where(Track.track_number == "TRK00001234")),
+        ("partial search by suffix",
+         select(Track).where(Track.track_number_rev >= "4321", Track.track_number_rev < "4322")),
+        ("batch update by departure day",
+         select(Track.id).where(Track.china_departure >= day, Track.china_departure < day + timedelta(days=1))),
+        ("warehouse inventory",
+         select(Track).where(Track.current_warehouse_id == 2)),
+        ("audit: recent logs",
+         select(AuditLog).order_by(AuditLog.timestamp.desc()).limit(100), True),
+        ("audit: date range",
+         select(AuditLog).where(AuditLog.timestamp >= day, AuditLog.timestamp <= NOW)
+         .order_by(AuditLog.timestamp.desc()).limit(100)),
+        ("audit: by action",
+         select(AuditLog).where(AuditLog.action == "UPLOAD_TRACKS")
+         .order_by(AuditLog.timestamp.desc()).limit(100)),
+        ("audit: by user",
+         select(AuditLog).where(AuditLog.performed_by == "admin3@cargo.kz")
+         .order_by(AuditLog.timestamp.desc()).limit(100)),
+        ("audit: by entity",
+         select(AuditLog).where(AuditLog.target_entity == "track", AuditLog.target_id == "TRK00001234")
+         .order_by(AuditLog.timestamp.desc()).limit(100)),
+        ("audit: page N (keyset)",
+         keyset(select(AuditLog))),
+        ("audit: page N by action (keyset)",
+         keyset(select(AuditLog).where(AuditLog.action == "UPLOAD_TRACKS"))),
+        ("audit: page N by user (keyset)",
+         keyset(select(AuditLog).where(AuditLog.performed_by == "admin3@cargo.kz"))),
+        ("audit: page N by entity (keyset)",
+         keyset(select(AuditLog).where(AuditLog.target_entity == "track", AuditLog.target_id == "TRK00001234"))),
+        ("audit: by warehouse",
+         select(AuditLog).where(AuditLog.warehouse_id == 2)
+         .order_by(AuditLog.timestamp.desc()).limit(100)),
+    ]
+
+
+def seed(conn):
+    rnd = random.Random(42)
+    tracks = []
+    for i in range(SEED_TRACKS):
+        tn = f"TRK{i:08d}"
+        tracks.append({
+            "track_number": tn,
+            "track_number_rev": tn[::-1],
+            "personal_code": str(1000 + i % 500),
+            "status_code": statuses.DELIVERED if i % 10 == 0 else rnd.choice(OTHER_STATUSES),
+            "current_warehouse_id": i % 4 + 1,
+            "china_departure": NOW - timedelta(days=i % 90),
+            "is_active": i % 3 != 0,
+            "created_at": NOW - timedelta(minutes=i),
+        })
+    conn.execute(TrackStatus.__table__.insert(), [{"id": c, "name": n} for c, n in statuses.DEFAULT_STATUSES.items()])
+    conn.execute(Track.__table__.insert(), tracks)
+    conn.execute(TrackEvent.__table__.insert(), [{
+        "track_id": i % SEED_TRACKS + 1,
+        "ts": NOW - timedelta(hours=i),
+        "kind": "upload",
+        "status_code": statuses.WAITING,
+    } for i in range(SEED_TRACKS * 3)])
+
+    logs = [{
+        "action": ACTIONS[i % len(ACTIONS)],
+        "performed_by": f"admin{i % 20}@cargo.kz",
+        "target_entity": "track",
+        "target_id": f"TRK{i:08d}",
+        "warehouse_id": i % 4 + 1,
+        "timestamp": NOW - timedelta(minutes=i * 7),
+    } for i in range(SEED_LOGS)]
+    conn.execute(AuditLog.__table__.insert(), logs)
+    conn.execute(text("ANALYZE"))
+
+
+def explain(conn, stmt) -> list:
+    """Return the plan lines for a statement on this connection's dialect."""
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    if conn.dialect.name == "sqlite":
+        return [row.detail for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+    return [row[0] for row in conn.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def plan_problems(dialect: str, plan: list, listing: bool = False) -> list:
+    """Plan lines that mean a full table (or whole index) read or an explicit sort."""
+    problems = []
+    for line in plan:
+        if dialect == "sqlite":
+            if line.startswith("SCAN"):
+                if not (listing and "INDEX" in line):
+                    problems.append(line)
+            elif "TEMP B-TREE" in line:
+                problems.append(line)
+        elif line.lstrip(" ->").startswith(("Seq Scan", "Sort")):
+            problems.append(line.strip())
+    # Postgres: a filtered query that walks an index without a condition reads all of it
+    if dialect != "sqlite" and not listing and not any("Index Cond" in line for line in plan):
+        problems.append("no Index Cond")
+    return problems
+
+
+def run_checks(url: str) -> bool:
+    engine = create_engine(url)
+    failed = False
+    # Everything runs in one transaction that is rolled back, nothing is left behind
+    with engine.connect() as conn:
+        Base.metadata.create_all(bind=conn)
+        seed(conn)
+        if conn.dialect.name == "postgresql":
+            # Tables this small are cheaper to seq-scan, ask whether an index path exists at all
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+
+        for name, stmt, *listing in hot_queries():
+            plan = explain(conn, stmt)
+            problems = plan_problems(conn.dialect.name, plan, bool(listing))
+            if problems:
+                failed = True
+                print(f"❌ {name}")
+                for line in plan:
+                    print(f"      {line}")
+            else:
+                print(f"✓ {name}: {' | '.join(line.strip() for line in plan)}")
+
+        conn.rollback()
+    engine.dispose()
+    return not failed
+
+
+if __name__ == "__main__":
+    url = os.getenv("PLAN_CHECK_DATABASE_URL", "sqlite://")
+    ok = run_checks(url)
+    print("\n✅ All hot queries use indexes" if ok else "\n❌ Some hot queries fall back to a full scan")
+    sys.exit(0 if ok else 1)
@@ -2,12 +2,12 @@
 import random
 import string
 from sqlalchemy.orm import Session
-from sqlalchemy import func, Integer
+from sqlalchemy import func, String, DateTime, select, update, insert, delete, and_, case, literal
 from sqlalchemy.exc import IntegrityError
-from datetime import date, datetime
-import json
-from backend.models import AuditLog
+from datetime import date, datetime, timedelta
 from backend.auth import get_password_hash
+from backend.cache import invalidate_tracks
+from backend import statuses
 
 
 # ==============================
@@ -21,30 +21,29 @@ def log_action(
     target_entity: str = None,
     target_id: int = None,
     details: dict = None,
-    ip_address: str = None  # ✅ Необязательный параметр
+    ip_address: str = None,  # ✅ Необязательный параметр
+    commit: bool = True,
+    sync: bool = False
 ):
-    """Log admin action to audit trail."""
-    log = AuditLog(
-        action=action,
-        performed_by=performed_by,
-        target_entity=target_entity,
-        target_id=target_id,
-        details=json.dumps(details) if details else None,
-        ip_address=ip_address,
-        timestamp=datetime.utcnow()
-    )
-    session.add(log)
-    session.commit()
+    """
+    Log admin action to audit trail.
+    With commit=False the entry joins the caller's transaction. Otherwise it
+    goes to the background writer (audit_sink) unless `sync` is set or the
+    action is compliance-critical; returns None when queued.
+    """
+    from backend import audit_sink
+    entry = audit_sink.build_entry(action, performed_by, target_entity, target_id, details, ip_address)
+    if commit and audit_sink.submit(entry, sync):
+        return None
+    log = audit_sink.add(session, entry)
+    if commit:
+        session.commit()
     return log
 
 def get_next_personal_code(db: Session) -> str:
-    """Get next sequential personal code."""
-    from backend import models
-    max_code = db.query(func.max(models.User.personal_code.cast(Integer))).scalar()
-    if max_code is None:
-        return "1"
-    else:
-        return str(max_code + 1)
+    """Get next sequential personal code (sequence / counter, no users scan)."""
+    from backend import personal_codes
+    return personal_codes.next_code()
 
 # backend/crud.py - ADD THESE FUNCTIONS
 
@@ -61,6 +60,8 @@ def create_warehouse(db: Session, name: str, code: str, address: str = None, man
     db.add(warehouse)
     db.commit()
     db.refresh(warehouse)
+    from backend.logger import invalidate_warehouses
+    invalidate_warehouses()
     return warehouse
 
 
@@ -79,6 +80,46 @@ def get_warehouse_by_code(db: Session, code: str):
     return db.query(models.Warehouse).filter(models.Warehouse.code == code.upper()).first()
 
 
+def warehouse_label(warehouse) -> str:
+    """Display text stored in Track.current_warehouse."""
+    return f"{warehouse.name} ({warehouse.code})"
+
+
+def match_warehouse(text: str, warehouses: list):
+    """
+    Resolve a free-text location ("Склад в Алматы (ALMATY)", "ALMATY",
+    "Склад в Алматы") to one of `warehouses`. Returns None if nothing matches.
+    """
+    if not text:
+        return None
+    value = text.strip().upper()
+    # "(CODE)" suffix written by the upload endpoints
+    if value.endswith(")") and "(" in value:
+        code = value[value.rindex("(") + 1:-1].strip()
+        for wh in warehouses:
+            if wh.code.upper() == code:
+                return wh
+    for wh in warehouses:
+        if value == wh.code.upper() or value == (wh.name or "").upper():
+            return wh
+    # Longest code first so "ALMATY2" is not taken for "ALMATY"
+    for wh in sorted(warehouses, key=lambda w: len(w.code), reverse=True):
+        if wh.code.upper() in value or (wh.name and wh.name.upper() in value):
+            return wh
+    return None
+
+
+def find_warehouse(db: Session, code_or_name: str):
+    """Get a warehouse by code, falling back to its name or a location label."""
+    from backend import models
+    if not code_or_name:
+        return None
+    warehouse = get_warehouse_by_code(db, code_or_name.strip())
+    if warehouse:
+        return warehouse
+    return match_warehouse(code_or_name, db.query(models.Warehouse).all())
+
+
 def receive_parcel_to_warehouse(db: Session, track_number: str, warehouse_code: str, received_by: str):
     """Mark parcel as received in warehouse."""
     from backend import models
@@ -90,11 +131,12 @@ def receive_parcel_to_warehouse(db: Session, track_number: str, warehouse_code:
     if not warehouse:
         return None
     
-    track.current_warehouse = warehouse.name
-    track.status = f"В складе {warehouse.code}"
-    track.received_date = datetime.utcnow()
-    track.received_by = received_by
+    track.current_warehouse = warehouse_label(warehouse)
+    track.current_warehouse_id = warehouse.id
+    track.status_code = statuses.AT_WAREHOUSE
+    add_track_event(db, track, statuses.EVENT_RECEIVE, received_by)
     db.commit()
+    invalidate_tracks([track.track_number])
     
     return track
 
@@ -106,10 +148,11 @@ def handout_parcel_to_client(db: Session, track_number: str, handed_by: str):
     if not track:
         return None
     
-    track.status = "Выдан клиенту"
+    track.status_code = statuses.DELIVERED
     track.handout_date = datetime.utcnow()
-    track.handed_by = handed_by
+    add_track_event(db, track, statuses.EVENT_HANDOUT, handed_by)
     db.commit()
+    invalidate_tracks([track.track_number])
     
     return track
 
@@ -133,27 +176,36 @@ def transfer_parcel(db: Session, track_number: str, from_warehouse: str, to_ware
     db.add(transfer)
     
     # Update track location
-    track.current_warehouse = to_warehouse
-    track.status = f"Переезд: {from_warehouse} → {to_warehouse}"
+    destination = find_warehouse(db, to_warehouse)
+    track.current_warehouse = warehouse_label(destination) if destination else to_warehouse
+    track.current_warehouse_id = destination.id if destination else None
+    add_track_event(db, track, statuses.EVENT_TRANSFER, transferred_by, note=f"{from_warehouse} → {to_warehouse}")
     
     db.commit()
+    invalidate_tracks([track.track_number])
     return transfer
 
 
 def get_warehouse_inventory(db: Session, warehouse_name: str):
     """Get all parcels in a warehouse."""
     from backend import models
+    warehouse = find_warehouse(db, warehouse_name)
+    if not warehouse:
+        return []
     return db.query(models.Track).filter(
-        models.Track.current_warehouse == warehouse_name,
-        models.Track.status != "Выдан клиенту"
+        models.Track.current_warehouse_id == warehouse.id,
+        models.Track.status_code != statuses.DELIVERED
     ).all()
 
 
 def get_parcels_by_warehouse_admin(db: Session, warehouse_name: str):
     """Get parcels for warehouse admin."""
     from backend import models
+    warehouse = find_warehouse(db, warehouse_name)
+    if not warehouse:
+        return []
     return db.query(models.Track).filter(
-        models.Track.current_warehouse.like(f"%{warehouse_name}%")
+        models.Track.current_warehouse_id == warehouse.id
     ).all()
 
 
@@ -175,6 +227,10 @@ def create_user(
     
     if not personal_code:
         personal_code = get_next_personal_code(db)
+    else:
+        # A hand-picked numeric code must not be handed out again later
+        from backend import personal_codes
+        personal_codes.bump_past(personal_code)
     
     hashed_password = get_password_hash(password)
     
@@ -248,6 +304,254 @@ def get_track_by_number(db: Session, track_number: str):
     return db.query(models.Track).filter(models.Track.track_number == track_number).first()
 
 
+def deliver_tracks(db: Session, track_numbers: list, handout_date: datetime = None,
+                   performed_by: str = None) -> tuple:
+    """
+    Mark tracks as handed out with one UPDATE per chunk.
+    Does not commit, so the caller can add its audit entry to the same
+    transaction. Returns (delivered, missing) in input order.
+    """
+    from backend import models
+    handout_date = handout_date or datetime.utcnow()
+    numbers = list(dict.fromkeys(track_numbers))
+    found = set()
+
+    for chunk in chunked(numbers):
+        found.update(db.execute(
+            select(models.Track.track_number).where(models.Track.track_number.in_(chunk))
+        ).scalars())
+        db.execute(
+            update(models.Track)
+            .where(models.Track.track_number.in_(chunk))
+            .values(status_code=statuses.DELIVERED, handout_date=handout_date, updated_at=handout_date)
+            .execution_options(synchronize_session=False)
+        )
+        log_track_events(db, [models.Track.track_number.in_(chunk)], statuses.EVENT_HANDOUT, performed_by, handout_date)
+
+    delivered = [tn for tn in numbers if tn in found]
+    missing = [tn for tn in numbers if tn not in found]
+    return delivered, missing
+
+
+def departure_day_filter(departure_date: date) -> list:
+    """
+    china_departure within one calendar day, as a range the column index can
+    serve (stored values may carry a time part, so equality is not enough).
+    """
+    from backend import models
+    day_start = datetime.combine(departure_date, datetime.min.time())
+    return [
+        models.Track.china_departure >= day_start,
+        models.Track.china_departure < day_start + timedelta(days=1)
+    ]
+
+
+# Rows changed per UPDATE when a departure day is too big for one statement
+BATCH_UPDATE_CHUNK_SIZE = 20000
+
+
+def update_tracks_by_departure(db: Session, departure_date: date, values: dict,
+                               performed_by: str = None) -> int:
+    """
+    Set `values` on every track that departed on the given day.
+
+    Normally a single indexed UPDATE. Days with more than
+    BATCH_UPDATE_CHUNK_SIZE tracks are updated in id-ordered chunks, each
+    committed separately, so one run never holds a huge write lock.
+    Returns the number of affected rows.
+    """
+    from backend import models
+    filters = departure_day_filter(departure_date)
+    now = datetime.utcnow()
+    values = dict(values, updated_at=now)
+
+    total = db.execute(select(func.count(models.Track.id)).where(*filters)).scalar()
+    if total <= BATCH_UPDATE_CHUNK_SIZE:
+        updated = db.execute(
+            update(models.Track).where(*filters).values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        log_track_events(db, filters, statuses.EVENT_BATCH, performed_by, now)
+        db.commit()
+        return updated
+
+    updated = 0
+    last_id = 0
+    while True:
+        ids = list(db.execute(
+            select(models.Track.id)
+            .where(*filters, models.Track.id > last_id)
+            .order_by(models.Track.id)
+            .limit(BATCH_UPDATE_CHUNK_SIZE)
+        ).scalars())
+        if not ids:
+            break
+        chunk_filters = [models.Track.id >= ids[0], models.Track.id <= ids[-1], *filters]
+        updated += db.execute(
+            update(models.Track)
+            .where(*chunk_filters)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        log_track_events(db, chunk_filters, statuses.EVENT_BATCH, performed_by, now)
+        db.commit()
+        last_id = ids[-1]
+    return updated
+
+
+def _delete_track_chunk(db: Session, chunk: list) -> tuple:
+    """
+    Delete one chunk of tracks and their dependent rows in one transaction
+    (rolled back on error, earlier chunks stay deleted). Returns (tracks, transfers).
+    """
+    from backend import models
+    try:
+        db.execute(
+            delete(models.TrackEvent)
+            .where(models.TrackEvent.track_id.in_(
+                select(models.Track.id).where(models.Track.track_number.in_(chunk))
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        transfers = db.execute(
+            delete(models.WarehouseTransfer)
+            .where(models.WarehouseTransfer.track_number.in_(chunk))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        tracks = db.execute(
+            delete(models.Track)
+            .where(models.Track.track_number.in_(chunk))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_tracks(chunk)
+    return tracks, transfers
+
+
+def delete_tracks(db: Session, track_numbers: list) -> dict:
+    """
+    Delete tracks by number with one DELETE per chunk, transfers first.
+    Each chunk is its own transaction so locks stay short.
+    """
+    from backend import models
+    result = {"deleted": 0, "transfers_deleted": 0, "tracks": []}
+    for chunk in chunked(list(dict.fromkeys(track_numbers))):
+        existing = list(db.execute(
+            select(models.Track.track_number).where(models.Track.track_number.in_(chunk))
+        ).scalars())
+        if not existing:
+            continue
+        tracks, transfers = _delete_track_chunk(db, existing)
+        result["deleted"] += tracks
+        result["transfers_deleted"] += transfers
+        result["tracks"].extend(existing)
+    return result
+
+
+def delete_tracks_by_filter(db: Session, departure_date: date = None, status: str = None) -> dict:
+    """
+    Delete every track with the given departure day and/or status, in
+    bounded chunks. At least one filter is required.
+    """
+    from backend import models
+    if departure_date is None and not status:
+        raise ValueError("departure_date or status is required")
+
+    filters = []
+    if departure_date is not None:
+        filters.extend(departure_day_filter(departure_date))
+    if status:
+        filters.append(models.Track.status_code == statuses.code(status))
+
+    result = {"deleted": 0, "transfers_deleted": 0, "tracks": []}
+    while True:
+        chunk = list(db.execute(
+            select(models.Track.track_number).where(*filters).limit(BULK_CHUNK_SIZE)
+        ).scalars())
+        if not chunk:
+            break
+        tracks, transfers = _delete_track_chunk(db, chunk)
+        result["deleted"] += tracks
+        result["transfers_deleted"] += transfers
+        if len(result["tracks"]) < 20:
+            result["tracks"].extend(chunk[:20 - len(result["tracks"])])
+    return result
+
+
+def lookup_tracks(db: Session, track_numbers: list) -> dict:
+    """
+    Fetch many tracks by number, with their event history, in one query per
+    chunk. Numbers missing from tracks are looked up in tracks_archive.
+    Returns {track_number: (row, events)}.
+    """
+    from backend import models
+    found = {}
+    for chunk in chunked(list(track_numbers)):
+        for row, events in tracks_with_history(db, models.Track.track_number.in_(chunk)):
+            found[row.track_number] = (row, events)
+
+    missing = [tn for tn in track_numbers if tn not in found]
+    for chunk in chunked(missing):
+        archive = models.TrackArchive
+        for row, events in tracks_with_history(db, archive.track_number.in_(chunk), model=archive):
+            found[row.track_number] = (row, events)  # later (newer) archive rows win
+    return found
+
+
+def _prefix_range(column, prefix: str):
+    """`column LIKE 'prefix%'` written as a range so any B-tree index serves it."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def search_tracks_partial(db: Session, fragment: str, mode: str = "auto", limit: int = 20) -> list:
+    """
+    Find tracks by the start or the end of their number.
+
+    Prefix matches use the track_number index, suffix matches the index on the
+    reversed number, so neither scans the table. Results are ranked: exact
+    match, then prefix, then suffix, shorter (closer) numbers first.
+    Returns (match_kind, row) pairs.
+    """
+    from backend import models
+    fragment = (fragment or "").strip().upper()
+    columns = (
+        models.Track.id,
+        models.Track.track_number,
+        models.Track.personal_code,
+        models.Track.status_code,
+        models.Track.china_departure,
+    )
+
+    ranked = {}
+    if mode in ("auto", "prefix"):
+        rows = db.execute(
+            select(*columns)
+            .where(_prefix_range(models.Track.track_number, fragment))
+            .order_by(models.Track.track_number)
+            .limit(limit)
+        ).all()
+        for row in rows:
+            rank = 0 if row.track_number == fragment else 1
+            ranked[row.track_number] = (rank, row)
+
+    if mode in ("auto", "suffix"):
+        rows = db.execute(
+            select(*columns)
+            .where(_prefix_range(models.Track.track_number_rev, fragment[::-1]))
+            .order_by(models.Track.track_number_rev)
+            .limit(limit)
+        ).all()
+        for row in rows:
+            ranked.setdefault(row.track_number, (2, row))
+
+    results = sorted(ranked.values(), key=lambda item: (item[0], len(item[1].track_number), item[1].track_number))
+    return [(("exact", "prefix", "suffix")[rank], row) for rank, row in results[:limit]]
+
+
 def get_user_tracks_by_code(db: Session, personal_code: str, is_active: bool = False):
     """Get all tracks for a user by personal code."""
     from backend import models
@@ -263,11 +567,13 @@ def create_or_update_track(db: Session, track_number: str, status: str, departur
     track = get_track_by_number(db, track_number)
     
     if track:
-        track.status = status
-        Track.china_departure = departure_date
+        track.current_status = status
+        track.china_departure = departure_date
         track.is_active = False  # Unarchive if was archived
         track.updated_at = datetime.utcnow()
+        add_track_event(db, track, statuses.EVENT_UPDATE)
         db.commit()
+        invalidate_tracks([track_number])
         print(f"[DB] Updated track: {track_number} to status '{status}'")
     else:
         track = models.Track(
@@ -278,7 +584,9 @@ def create_or_update_track(db: Session, track_number: str, status: str, departur
             is_active=False
         )
         db.add(track)
+        add_track_event(db, track, statuses.EVENT_CREATED)
         db.commit()
+        invalidate_tracks([track_number])
         print(f"[DB] Created new unassigned track: {track_number} with status '{status}'")
     
     return track
@@ -295,6 +603,7 @@ def assign_track_to_user(db: Session, track_number: str, personal_code: str):
         track.personal_code = personal_code
         track.updated_at = datetime.utcnow()
         db.commit()
+        invalidate_tracks([track_number])
         print(f"[DB] Assigned track {track_number} to user {personal_code}")
         return track
     else:
@@ -306,24 +615,340 @@ def assign_track_to_user(db: Session, track_number: str, personal_code: str):
             is_active=False
         )
         db.add(new_track)
+        add_track_event(db, new_track, statuses.EVENT_CREATED, personal_code)
         db.commit()
         db.refresh(new_track)
+        invalidate_tracks([track_number])
         print(f"[DB] Registered new track {track_number} by user {personal_code}")
         return new_track
 
 
 def archive_track(db: Session, track_number: str):
-    """Archive a track (soft delete)."""
-    from backend import models
+    """Move a track to tracks_archive now (the scheduler does this in bulk)."""
+    from backend import archive
     track = get_track_by_number(db, track_number)
     if track:
-        track.is_active = True
-        track.updated_at = datetime.utcnow()
-        db.commit()
-        return True
+        return archive.archive_tracks(db, [track.id]) > 0
     return False
 
 
+def get_archived_track(db: Session, track_number: str):
+    """Most recently archived track with this number, or None."""
+    from backend import models
+    return db.query(models.TrackArchive).filter(
+        models.TrackArchive.track_number == track_number
+    ).order_by(models.TrackArchive.archived_at.desc()).first()
+
+
+def statistics_query():
+    """
+    The /api/stats counters as one statement: (users, tracks, delivered,
+    warehouses). One pass over tracks plus two counts, no per-status queries.
+    """
+    from backend import models
+    return select(
+        select(func.count(models.User.id)).scalar_subquery(),
+        func.count(models.Track.id),
+        func.count(case((models.Track.status_code == statuses.DELIVERED, 1))),
+        select(func.count(models.Warehouse.id)).scalar_subquery()
+    ).select_from(models.Track)
+
+
+# ==============================
+# Bulk track operations
+# ==============================
+# SQLite allows 999 bound parameters per statement on older builds,
+# so every IN (...) list and multi-row INSERT is cut to this size.
+BULK_CHUNK_SIZE = 500
+
+
+def chunked(items: list, size: int = BULK_CHUNK_SIZE):
+    """Yield successive slices of `items` with at most `size` elements."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _track_insert(db: Session):
+    """INSERT for tracks using the dialect's native upsert when available."""
+    from backend import models
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(models.Track), False
+    return dialect_insert(models.Track), True
+
+
+def bulk_upsert_tracks(db: Session, track_numbers, status: str, departure_date, extra: dict = None,
+                       performed_by: str = None) -> dict:
+    """
+    Create or update many tracks with chunked set-based statements.
+
+    Existing track numbers are looked up with one IN (...) query per chunk,
+    new ones are written with a multi-row INSERT and known ones with a single
+    UPDATE. Rows that already carry the same status and departure date are
+    left alone, so a re-uploaded manifest only writes the rows that changed.
+    Each chunk is committed on its own, so a bad chunk only fails its own rows.
+    `extra` holds further column values (e.g. the warehouse) set on every row.
+    Created and changed rows get a track event each (one INSERT ... SELECT).
+    Raises statuses.UnknownStatus before writing anything if `status` is unknown.
+    Returns per-row counts: created, updated, unchanged, failed and error messages.
+    """
+    from backend import models
+
+    result = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": []}
+    numbers = list(dict.fromkeys(track_numbers))  # dedup, keep file order
+    now = datetime.utcnow()
+    # china_departure is a DateTime column, compare against what it reads back as
+    departure_dt = departure_date
+    if isinstance(departure_date, date) and not isinstance(departure_date, datetime):
+        departure_dt = datetime.combine(departure_date, datetime.min.time())
+
+    extra = extra or {}
+    status_code = statuses.code(status)
+    values = dict(extra, status_code=status_code, china_departure=departure_date)
+    wanted = dict(extra, status_code=status_code, china_departure=departure_dt)
+
+    for chunk in chunked(numbers):
+        try:
+            rows = db.execute(
+                select(
+                    models.Track.track_number,
+                    *(getattr(models.Track, column) for column in wanted)
+                ).where(models.Track.track_number.in_(chunk))
+            ).all()
+            existing = {row.track_number for row in rows}
+            changed = [
+                row.track_number for row in rows
+                if any(getattr(row, column) != value for column, value in wanted.items())
+            ]
+            new_numbers = [tn for tn in chunk if tn not in existing]
+
+            if changed:
+                db.execute(
+                    update(models.Track)
+                    .where(models.Track.track_number.in_(changed))
+                    .values(**values, updated_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+
+            if new_numbers:
+                stmt, native = _track_insert(db)
+                if native:
+                    # A concurrent upload may insert the same number between
+                    # the lookup and this INSERT - turn it into an update.
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["track_number"],
+                        set_={
+                            column: getattr(stmt.excluded, column)
+                            for column in list(values) + ["updated_at"]
+                        }
+                    )
+                db.execute(stmt, [{
+                    **values,
+                    "track_number": tn,
+                    "track_number_rev": tn[::-1],
+                    "is_active": True,
+                    "created_at": now,
+                    "updated_at": now
+                } for tn in new_numbers])
+
+            if changed:
+                log_track_events(db, [models.Track.track_number.in_(changed)], statuses.EVENT_UPLOAD, performed_by, now)
+            if new_numbers:
+                log_track_events(db, [models.Track.track_number.in_(new_numbers)], statuses.EVENT_CREATED, performed_by, now)
+            db.commit()
+            invalidate_tracks(chunk)
+            result["created"] += len(new_numbers)
+            result["updated"] += len(changed)
+            result["unchanged"] += len(existing) - len(changed)
+        except Exception as e:
+            db.rollback()
+            result["failed"] += len(chunk)
+            result["errors"].append(f"{chunk[0]}..{chunk[-1]}: {str(e)}")
+
+    print(f"[DB] Bulk upsert: {result['created']} created, {result['updated']} updated, "
+          f"{result['unchanged']} unchanged, {result['failed']} failed")
+    return result
+
+
+def bulk_create_tracks(db: Session, rows: list, status: str, performed_by: str = None) -> dict:
+    """
+    Insert new assigned tracks from (track_number, personal_code) pairs.
+    Numbers that already exist are skipped and returned in `existing`.
+    """
+    from backend import models
+
+    result = {"created": 0, "existing": []}
+    now = datetime.utcnow()
+    status_code = statuses.code(status)
+    codes = dict(rows)  # last row wins for repeated numbers
+
+    for chunk in chunked(list(codes)):
+        existing = set(db.execute(
+            select(models.Track.track_number).where(models.Track.track_number.in_(chunk))
+        ).scalars())
+        new_rows = [{
+            "track_number": tn,
+            "track_number_rev": tn[::-1],
+            "personal_code": codes[tn],
+            "status_code": status_code,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now
+        } for tn in chunk if tn not in existing]
+        if new_rows:
+            db.execute(insert(models.Track), new_rows)
+            log_track_events(db, [models.Track.track_number.in_([row["track_number"] for row in new_rows])],
+                             statuses.EVENT_CREATED, performed_by, now)
+        db.commit()
+        invalidate_tracks(row["track_number"] for row in new_rows)
+        result["created"] += len(new_rows)
+        result["existing"].extend(tn for tn in chunk if tn in existing)
+
+    return result
+
+
+# ==============================
+# Track events (history)
+# ==============================
+# Every status or location change appends a row to track_events with the
+# status and warehouse the track has afterwards. Who did it (performed_by)
+# and the handout recipient / transfer route (note) live only here: tracks
+# has no columns for them. Kinds are statuses.EVENT_*. Callers commit.
+
+EVENT_COLUMNS = ["track_id", "ts", "kind", "status_code", "warehouse_id", "performed_by", "note"]
+
+
+def add_track_event(db: Session, track, kind: str, performed_by: str = None, note: str = None):
+    """Append an event for one ORM track (flushes first if it is new)."""
+    from backend import models
+    if track.id is None:
+        db.flush()
+    db.add(models.TrackEvent(
+        track_id=track.id,
+        ts=datetime.utcnow(),
+        kind=kind,
+        status_code=track.status_code,
+        warehouse_id=track.current_warehouse_id,
+        performed_by=performed_by,
+        note=note
+    ))
+
+
+def log_track_events(db: Session, where: list, kind: str, performed_by: str = None,
+                     ts: datetime = None, note: str = None):
+    """
+    Append an event for every track matching the `where` clauses with one
+    INSERT ... SELECT, so bulk writers stay set-based.
+    """
+    from backend import models
+    db.execute(insert(models.TrackEvent).from_select(
+        EVENT_COLUMNS,
+        select(
+            models.Track.id,
+            literal(ts or datetime.utcnow(), DateTime),
+            literal(kind, String),
+            models.Track.status_code,
+            models.Track.current_warehouse_id,
+            literal(performed_by, String),
+            literal(note, String)
+        ).where(*where)
+    ))
+
+
+def tracks_with_history(db: Session, *where, model=None) -> list:
+    """
+    Tracks matching `where` with their events, in one query (tracks LEFT JOIN
+    track_events, read in (track_id, ts) index order). Pass
+    model=models.TrackArchive to read archived tracks.
+    Returns [(track_row, [event_row, ...])] ordered by track id.
+    """
+    from backend import models
+    model = model or models.Track
+    event = models.TrackEvent
+    rows = db.execute(
+        select(
+            model.id,
+            model.track_number,
+            model.personal_code,
+            model.status_code,
+            model.china_arrival,
+            model.china_departure,
+            model.kz_arrival,
+            model.handout_date,
+            event.ts.label("event_ts"),
+            event.kind.label("event_kind"),
+            event.status_code.label("event_status_code"),
+            models.Warehouse.name.label("event_warehouse"),
+            event.note.label("event_note")
+        )
+        .outerjoin(event, event.track_id == model.id)
+        .outerjoin(models.Warehouse, models.Warehouse.id == event.warehouse_id)
+        .where(*where)
+        .order_by(model.id, event.ts, event.id)
+    ).all()
+
+    result = []
+    for row in rows:
+        if not result or result[-1][0].id != row.id:
+            result.append((row, []))
+        if row.event_ts is not None:
+            result[-1][1].append(row)
+    return result
+
+
+# ==============================
+# Uploads (manifest dedup)
+# ==============================
+def get_upload_by_hash(db: Session, content_hash: str):
+    """Get the upload record for a manifest content hash."""
+    from backend import models
+    return db.query(models.Upload).filter(models.Upload.content_hash == content_hash).first()
+
+
+def start_upload(db: Session, content_hash: str, filename: str, track_status: str,
+                 departure_date: date, uploaded_by: str, job_id: str):
+    """Record (or restart) an upload for a content hash with state 'running'."""
+    from backend import models
+    upload = get_upload_by_hash(db, content_hash)
+    if not upload:
+        upload = models.Upload(content_hash=content_hash)
+        db.add(upload)
+    upload.filename = filename
+    upload.track_status = track_status
+    upload.departure_date = departure_date
+    upload.uploaded_by = uploaded_by
+    upload.job_id = job_id
+    upload.state = "running"
+    upload.created = upload.updated = upload.unchanged = upload.failed = upload.invalid = 0
+    upload.created_at = datetime.utcnow()
+    upload.finished_at = None
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+
+def finish_upload(db: Session, upload_id: int, state: str, totals: dict = None):
+    """Store the final state and row counts of an upload."""
+    from backend import models
+    upload = db.query(models.Upload).filter(models.Upload.id == upload_id).first()
+    if not upload:
+        return None
+    upload.state = state
+    if totals:
+        upload.created = totals.get("created", 0)
+        upload.updated = totals.get("updated", 0)
+        upload.unchanged = totals.get("unchanged", 0)
+        upload.failed = totals.get("failed", 0)
+        upload.invalid = totals.get("invalid", 0)
+    upload.finished_at = datetime.utcnow()
+    db.commit()
+    return upload
+
+
 # ==============================
 # Audit Logs
 # ==============================
@@ -333,17 +958,10 @@ def create_audit_log(
     performed_by: str,
     target_entity: str,
     target_id: str,
-    details: str = None
+    details: dict = None
 ):
     """Create an audit log entry."""
-    from backend import models
-    log = models.AuditLog(
-        action=action,
-        performed_by=performed_by,
-        target_entity=target_entity,
-        target_id=target_id,
-        details=details
-    )
-    db.add(log)
+    from backend import audit_sink
+    audit_sink.add(db, audit_sink.build_entry(action, performed_by, target_entity, target_id, details))
     db.commit()
     print(f"[AUDIT] {action} by {performed_by} on {target_entity}:{target_id}")
@@ -3,6 +3,7 @@
 Database configuration for Delta Cargo system.
 """
 
+import json
 import os
 from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
@@ -12,21 +13,51 @@ from sqlalchemy.pool import StaticPool
 # Use SQLite for local development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cargo.db")
 
+
+def _json_serializer(value):
+    # Keep Cyrillic readable in JSON columns (and searchable by the audit full-text index)
+    return json.dumps(value, ensure_ascii=False)
+
+
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))  # seconds a writer waits for the lock
+
+# An in-memory database exists only inside its one connection, so every
+# session and thread has to share it. Background workers check this flag and
+# stay off (or run inline) rather than commit/roll back each other's work.
+SHARED_CONNECTION = DATABASE_URL.startswith("sqlite") and (
+    DATABASE_URL in ("sqlite://", "sqlite:///") or ":memory:" in DATABASE_URL
+)
+
 # Create engine
-if DATABASE_URL.startswith("sqlite"):
+if SHARED_CONNECTION:
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
+        json_serializer=_json_serializer,
         echo=False
     )
-    
-    # Enable foreign keys for SQLite
-    # @event.listens_for(engine, "connect")
-   # def set_sqlite_pragma(dbapi_conn, connection_record):
-       # cursor = dbapi_conn.cursor()
-        #cursor.execute("PRAGMA foreign_keys=ON")
-      #  cursor.close()
+    print(f"[DB] Using in-memory SQLite: {DATABASE_URL} (one shared connection)")
+elif DATABASE_URL.startswith("sqlite"):
+    # File SQLite: a connection per session/thread from the pool, so a
+    # background job's commit or rollback never touches a request's transaction
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
+        pool_size=10,
+        max_overflow=20,
+        json_serializer=_json_serializer,
+        echo=False
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        # WAL: readers (exports, dashboards) don't block the writer and vice versa
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}")
+        cursor.close()
     
     print(f"[DB] Using SQLite: {DATABASE_URL}")
 else:
@@ -36,7 +67,8 @@ else:
         echo=False,
         pool_pre_ping=True,
         pool_size=10,
-        max_overflow=20
+        max_overflow=20,
+        json_serializer=_json_serializer
     )
     print("[DB] Using PostgreSQL")
 
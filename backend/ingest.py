@@ -0,0 +1,224 @@
+# backend/ingest.py
+"""
+Streaming ingest of track manifests (Excel/CSV/TXT).
+
+Uploads are spooled to a temp file and read row by row, so memory stays flat
+whatever the file size, and batches reach the database while the rest of the
+file is still being parsed.
+"""
+
+import csv
+import hashlib
+import os
+import re
+import tempfile
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+import backend.crud as crud
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # 1 MB per read from the request body
+BATCH_SIZE = 1000                 # track numbers handed to the writer at once
+MAX_ERRORS_KEPT = 50
+
+# Letters, digits and the separators carriers print on labels
+TRACK_NUMBER_RE = re.compile(r"^[A-Z0-9][A-Z0-9\-_/]{2,63}$")
+
+
+# ==============================
+# Spooling
+# ==============================
+async def spool_upload(file) -> str:
+    """Copy an UploadFile to a temp file in fixed-size chunks. Returns its path."""
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    tmp = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            tmp.write(chunk)
+    finally:
+        tmp.close()
+    return tmp.name
+
+
+def manifest_hash(path: str, *fields) -> str:
+    """sha256 of a spooled file plus the form fields that change its meaning."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    for field in fields:
+        digest.update(b"\0" + str(field or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def remove_spooled(path: Optional[str]):
+    """Delete a spooled upload, ignoring files that are already gone."""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"[INGEST] Could not remove {path}: {e}")
+
+
+# ==============================
+# Row readers
+# ==============================
+# openpyxl and pandas are imported lazily: most manifests are plain text and
+# loading them costs more than parsing the whole file.
+def _iter_xlsx_rows(path: str) -> Iterator[tuple]:
+    import openpyxl
+    # read_only keeps only the current row in memory instead of the whole sheet
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def _iter_xls_rows(path: str) -> Iterator[tuple]:
+    # Legacy .xls is not supported by openpyxl, pandas/xlrd loads it whole
+    import pandas as pd
+    df = pd.read_excel(path, header=None, dtype=str)
+    for row in df.itertuples(index=False, name=None):
+        yield row
+
+
+def iter_rows(path: str, filename: str) -> Iterator:
+    """
+    Yield raw rows of an Excel manifest (.xlsx/.xls) one at a time.
+    TXT and CSV are read line by line in _iter_first_column instead.
+    """
+    if (filename or "").lower().endswith(".xlsx"):
+        return _iter_xlsx_rows(path)
+    return _iter_xls_rows(path)
+
+
+# ==============================
+# Normalization & batching
+# ==============================
+def cell_text(value) -> Optional[str]:
+    """Render a cell as stripped text. Returns None for empty cells."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # numeric Excel cells come back as 123.0
+    return str(value).strip() or None
+
+
+def normalize_track_number(value) -> Optional[str]:
+    """Strip and upper-case a cell value. Returns None for empty cells."""
+    track_number = (cell_text(value) or "").upper()
+    if not track_number or track_number in ("NAN", "NONE"):
+        return None
+    return track_number
+
+
+def _iter_first_column(path: str, filename: str) -> Iterator[str]:
+    """
+    Yield the raw first-column value of every row, one item per physical
+    line / sheet row (None for an empty sheet row), so callers can number them.
+
+    TXT and CSV never go through a row reader object: a line without quotes
+    is split on the first comma directly, only quoted lines use csv.reader.
+    """
+    name = (filename or "").lower()
+    if name.endswith((".xlsx", ".xls")):
+        for row in iter_rows(path, filename):
+            yield row[0] if row else None
+        return
+
+    is_csv = name.endswith(".csv")
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line in f:
+            if is_csv:
+                if '"' in line:
+                    row = next(csv.reader([line]), None)
+                    line = row[0] if row else ""
+                else:
+                    line = line.split(",", 1)[0]
+            yield line
+
+
+class ManifestReader:
+    """
+    Reads track numbers from a spooled manifest with dedup and validation.
+    Counters are filled in while `batches()` is consumed; `rows` counts
+    non-empty rows, error messages give the file's line (sheet row) number,
+    header included.
+
+    Dedup keeps every distinct number of the file in a set: roughly 110 bytes
+    each, so about 110 MB for a manifest of a million distinct numbers. That
+    is the memory bound of an import; the batches themselves stay flat.
+    """
+
+    def __init__(self, path: str, filename: str, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.filename = filename
+        self.batch_size = batch_size
+        self.rows = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def batches(self) -> Iterator[List[str]]:
+        """Yield lists of unique, valid, normalized track numbers in file order."""
+        seen = set()
+        batch = []
+        for line, value in enumerate(_iter_first_column(self.path, self.filename), start=1):
+            track_number = normalize_track_number(value)
+            if not track_number:
+                continue
+            self.rows += 1
+            if track_number in seen:
+                self.duplicates += 1
+                continue
+            seen.add(track_number)
+            if not TRACK_NUMBER_RE.match(track_number):
+                self.invalid += 1
+                if len(self.errors) < MAX_ERRORS_KEPT:
+                    self.errors.append(f"Line {line}: invalid track number '{track_number[:64]}'")
+                continue
+            batch.append(track_number)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def import_track_file(db: Session, path: str, filename: str, status: str, departure_date,
+                      on_batch: Optional[Callable[[dict], None]] = None, extra: dict = None,
+                      performed_by: str = None) -> dict:
+    """
+    Stream a spooled manifest into the tracks table batch by batch.
+    `on_batch` is called with each batch result (used for job progress),
+    `extra` and `performed_by` are passed through to crud.bulk_upsert_tracks.
+    """
+    reader = ManifestReader(path, filename)
+    totals = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0, "invalid": 0, "duplicates": 0, "errors": []}
+    for batch in reader.batches():
+        result = crud.bulk_upsert_tracks(db, batch, status, departure_date, extra, performed_by)
+        if on_batch:
+            on_batch(result)
+        totals["created"] += result["created"]
+        totals["updated"] += result["updated"]
+        totals["unchanged"] += result["unchanged"]
+        totals["failed"] += result["failed"]
+        totals["errors"].extend(result["errors"])
+
+    # Invalid rows never reach the writer, report them as failed (and apart:
+    # unlike write failures they fail again on every re-upload)
+    if reader.invalid:
+        invalid = {"created": 0, "updated": 0, "unchanged": 0, "failed": reader.invalid, "errors": reader.errors}
+        if on_batch:
+            on_batch(invalid)
+        totals["failed"] += reader.invalid
+        totals["invalid"] = reader.invalid
+        totals["errors"].extend(reader.errors)
+    totals["duplicates"] = reader.duplicates
+    return totals
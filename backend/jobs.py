@@ -0,0 +1,222 @@
+# backend/jobs.py
+"""
+Background import jobs for large track manifests.
+
+The upload endpoint spools the file, submits a job and returns its id at once.
+A small thread pool runs the import batch by batch with its own DB session,
+and GET /api/jobs/{id} reports progress from the in-process registry. On an
+in-memory database (db.SHARED_CONNECTION) the import runs inline in the
+request instead: a worker thread would commit and roll back on the
+connection the requests share.
+
+Every manifest is recorded in the uploads table by content hash, so an
+identical re-upload of a finished import is answered from that record without
+touching tracks. An import that had write failures runs again; lines that
+failed validation alone don't count, the same file would fail them again.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from backend import db
+from backend.models import User
+from backend.logger import AuditLogger
+import backend.crud as crud
+import backend.ingest as ingest
+
+MAX_WORKERS = 2           # imports are DB-bound, more workers only add lock contention
+JOB_TTL_SECONDS = 3600    # finished jobs are kept this long for polling
+MAX_ERRORS_KEPT = 50
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="import-job")
+_jobs = {}
+_lock = threading.Lock()
+
+
+class ImportJob:
+    """Progress of one manifest import."""
+
+    def __init__(self, filename: str, submitted_by: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.submitted_by = submitted_by
+        self.status = "queued"  # queued, running, done, failed
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.errors = []
+        self.error = None
+        self.submitted_at = datetime.utcnow()
+        self.started = None
+        self.finished = None
+
+    def add_batch(self, result: dict):
+        """Fold a bulk_upsert_tracks result into the job counters."""
+        with _lock:
+            self.created += result["created"]
+            self.updated += result["updated"]
+            self.unchanged += result["unchanged"]
+            self.failed += result["failed"]
+            self.processed += result["created"] + result["updated"] + result["unchanged"] + result["failed"]
+            room = MAX_ERRORS_KEPT - len(self.errors)
+            if room > 0:
+                self.errors.extend(result["errors"][:room])
+
+    def to_dict(self) -> dict:
+        with _lock:
+            end = self.finished or time.monotonic()
+            elapsed = end - self.started if self.started else 0.0
+            return {
+                "id": self.id,
+                "status": self.status,
+                "filename": self.filename,
+                "submitted_by": self.submitted_by,
+                "processed": self.processed,
+                "created": self.created,
+                "updated": self.updated,
+                "unchanged": self.unchanged,
+                "failed": self.failed,
+                "duplicates": self.duplicates,
+                "errors": list(self.errors),
+                "error": self.error,
+                "elapsed_seconds": round(elapsed, 2),
+                "rows_per_second": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0,
+                "submitted_at": self.submitted_at.isoformat()
+            }
+
+
+def _run_import(job: ImportJob, path: str, status: str, departure_date,
+                user_id: int, ip_address: str, upload_id: int, extra: dict):
+    session = db.SessionLocal()
+    totals = None
+    try:
+        with _lock:
+            job.status = "running"
+            job.started = time.monotonic()
+
+        totals = ingest.import_track_file(
+            session, path, job.filename, status, departure_date,
+            on_batch=job.add_batch, extra=extra, performed_by=job.submitted_by
+        )
+        with _lock:
+            job.duplicates = totals["duplicates"]
+
+        admin = session.query(User).filter(User.id == user_id).first()
+        if admin:
+            AuditLogger.log_tracks_uploaded(
+                db=session,
+                admin=admin,
+                count=job.created + job.updated,
+                filename=job.filename,
+                ip_address=ip_address
+            )
+
+        crud.finish_upload(session, upload_id, "done", totals)
+        with _lock:
+            job.status = "done"
+        print(f"✅ [JOBS] Import {job.id} done: {job.created} created, {job.updated} updated, "
+              f"{job.unchanged} unchanged, {job.failed} failed")
+    except Exception as e:
+        session.rollback()
+        with _lock:
+            job.status = "failed"
+            job.error = str(e)
+        print(f"❌ [JOBS] Import {job.id} failed: {e}")
+        try:
+            crud.finish_upload(session, upload_id, "failed", totals)
+        except Exception as upload_error:
+            print(f"⚠️ [JOBS] Could not mark upload {upload_id} failed: {upload_error}")
+    finally:
+        with _lock:
+            job.finished = time.monotonic()
+        session.close()
+        ingest.remove_spooled(path)
+
+
+def _prune_finished():
+    now = time.monotonic()
+    with _lock:
+        expired = [
+            job_id for job_id, job in _jobs.items()
+            if job.finished and now - job.finished > JOB_TTL_SECONDS
+        ]
+        for job_id in expired:
+            del _jobs[job_id]
+
+
+def _duplicate(previous) -> dict:
+    """Response for a re-upload answered from its uploads record."""
+    return {
+        "job_id": previous.job_id if previous.state == "running" else None,
+        "status": previous.state,
+        "duplicate": True,
+        "created": previous.created,
+        "updated": previous.updated,
+        "unchanged": previous.unchanged,
+        "failed": previous.failed,
+        "invalid": previous.invalid or 0,
+        "uploaded_at": previous.created_at.isoformat() if previous.created_at else None,
+        "uploaded_by": previous.uploaded_by
+    }
+
+
+def submit_import(session, path: str, filename: str, status: str, departure_date,
+                  admin: User, ip_address: str, extra: dict = None) -> dict:
+    """
+    Queue a spooled manifest for import. The worker removes the file when done.
+    `extra` column values (e.g. the warehouse) are set on every imported track.
+
+    If the same file was already imported without write failures (or is being
+    imported) with the same departure date, status and extra values, nothing
+    is queued: the stored counts are returned with duplicate=True (or the id
+    of the job still importing it). Re-uploading after fixing whatever made
+    rows fail to write imports it again.
+    """
+    content_hash = ingest.manifest_hash(path, departure_date, status, *sorted((extra or {}).items()))
+    previous = crud.get_upload_by_hash(session, content_hash)
+    # A 'running' record without a live job was cut short by a restart
+    if previous and ((previous.state == "done" and (previous.failed or 0) <= (previous.invalid or 0)) or
+                     (previous.state == "running" and get_job(previous.job_id))):
+        ingest.remove_spooled(path)
+        print(f"🔹 [JOBS] {filename} by {admin.email} is a re-upload of upload {previous.id}, skipped")
+        return _duplicate(previous)
+
+    _prune_finished()
+    job = ImportJob(filename, admin.email)
+    try:
+        upload = crud.start_upload(session, content_hash, filename, status, departure_date, admin.email, job.id)
+    except IntegrityError:
+        # The same file submitted twice at once: the other request recorded it first
+        session.rollback()
+        ingest.remove_spooled(path)
+        previous = crud.get_upload_by_hash(session, content_hash)
+        print(f"🔹 [JOBS] {filename} by {admin.email} is already being imported as upload {previous.id}, skipped")
+        return _duplicate(previous)
+    with _lock:
+        _jobs[job.id] = job
+    if db.SHARED_CONNECTION:
+        _run_import(job, path, status, departure_date, admin.id, ip_address, upload.id, extra)
+        return {"job_id": job.id, "status": job.status, "duplicate": False}
+    _executor.submit(_run_import, job, path, status, departure_date, admin.id, ip_address, upload.id, extra)
+    print(f"🔹 [JOBS] Queued import {job.id}: {filename} by {admin.email}")
+    return {"job_id": job.id, "status": job.status, "duplicate": False}
+
+
+def get_job(job_id: str) -> Optional[ImportJob]:
+    """Look up a job by id."""
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def shutdown():
+    """Wait for running imports to finish."""
+    _executor.shutdown(wait=True)
@@ -1,8 +1,107 @@
-from sqlalchemy.orm import Session
-from backend.models import AuditLog, User
+import base64
+import time
 from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, Query
+from backend.models import AuditLog, User, Warehouse
+from backend.cache import TTLCache
+from backend import audit_files, audit_sink
 from typing import Optional
-import json
+
+MAX_PAGE_SIZE = 1000
+
+# (id, name, code) of all warehouses, for resolving logged warehouse names/codes.
+# Warehouse writes call invalidate_warehouses(); a name that matches nothing
+# reloads the list (at most once a second) before warehouse_id is left NULL,
+# which covers warehouses created by another worker.
+_warehouse_cache = TTLCache(maxsize=1, ttl=60)
+WAREHOUSE_RELOAD_SECONDS = 1.0
+_warehouses_loaded_at = 0.0
+
+
+def _warehouses(db: Session) -> list:
+    def load():
+        global _warehouses_loaded_at
+        _warehouses_loaded_at = time.monotonic()
+        return db.query(Warehouse.id, Warehouse.name, Warehouse.code).all()
+    return _warehouse_cache.get_or_compute("all", load)
+
+
+def invalidate_warehouses():
+    """Drop the cached warehouse list (after creating, renaming or deleting a warehouse)."""
+    _warehouse_cache.clear()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    """Opaque cursor pointing just past the entry (timestamp, log_id) in (timestamp, id) DESC order."""
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def keyset_page(query: Query, cursor: Optional[str] = None, limit: int = 100, offset: int = 0):
+    """
+    One page of an AuditLog query, newest first, keyed on (timestamp, id):
+    the cursor becomes an index seek, so every page costs the same as the
+    first. Returns (logs, next_cursor); next_cursor is None on the last page.
+    `offset` is only for old clients that still page with it.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor)
+        query = query.filter(tuple_(AuditLog.timestamp, AuditLog.id) < (timestamp, log_id))
+    query = query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+    if offset and not cursor:
+        query = query.offset(offset)
+    logs = query.limit(limit + 1).all()
+    if len(logs) > limit:
+        return logs[:limit], encode_cursor(logs[limit - 1].timestamp, logs[limit - 1].id)
+    return logs, None
+
+
+def audit_columns(db: Session, target_entity: Optional[str], target_id, details: Optional[dict]) -> dict:
+    """
+    Values for the indexed AuditLog columns, taken from `details`:
+    warehouse (warehouse or branch, resolved to warehouse_id), track_number, count.
+    """
+    from backend.crud import match_warehouse
+    details = details if isinstance(details, dict) else {}
+
+    warehouse = details.get("warehouse") or details.get("branch")
+    warehouse = str(warehouse)[:255] if warehouse else None
+    matched = match_warehouse(warehouse, _warehouses(db)) if warehouse else None
+    if warehouse and not matched and time.monotonic() - _warehouses_loaded_at > WAREHOUSE_RELOAD_SECONDS:
+        # warehouse_id is written once: don't leave it NULL because of a stale list
+        invalidate_warehouses()
+        matched = match_warehouse(warehouse, _warehouses(db))
+
+    track_number = details.get("track_number")
+    if not track_number and (target_entity or "").lower() == "track" and target_id \
+            and not str(target_id).isdigit():
+        track_number = target_id  # some callers put the number in target_id
+
+    count = details.get("count")
+    if isinstance(count, bool) or not isinstance(count, int):
+        count = None
+
+    return {
+        "warehouse": warehouse,
+        "warehouse_id": matched.id if matched else None,
+        "track_number": str(track_number).upper()[:255] if track_number else None,
+        "count": count,
+    }
 
 
 class AuditLogger:
@@ -16,10 +115,13 @@ class AuditLogger:
         target_entity: Optional[str] = None,
         target_id: Optional[str] = None,
         details: Optional[dict] = None,
-        ip_address: Optional[str] = None
+        ip_address: Optional[str] = None,
+        sync: bool = False
     ):
         """
         Log a user action to the audit log.
+        Queued for the background writer (audit_sink) unless `sync` is set,
+        the action is compliance-critical or the writer is not running.
         
         Args:
             db: Database session
@@ -29,19 +131,15 @@ class AuditLogger:
             target_id: ID of the affected entity
             details: Additional details as dictionary
             ip_address: IP address of the user
+            sync: Commit the entry before returning
         """
+        entry = audit_sink.build_entry(action, performed_by, target_entity, target_id, details, ip_address)
+        if audit_sink.submit(entry, sync):
+            print(f"[AUDIT] {action} by {performed_by} on {target_entity}:{target_id} (queued)")
+            return
+
         try:
-            log_entry = AuditLog(
-                action=action,
-                performed_by=performed_by,
-                target_entity=target_entity,
-                target_id=str(target_id) if target_id else None,
-                details=json.dumps(details, ensure_ascii=False) if details else None,
-                ip_address=ip_address,
-                timestamp=datetime.utcnow()
-            )
-            
-            db.add(log_entry)
+            audit_sink.add(db, entry)
             db.commit()
             
             print(f"[AUDIT] {action} by {performed_by} on {target_entity}:{target_id}")
@@ -209,34 +307,32 @@ class AuditLogger:
         )
     
     @staticmethod
-    def get_user_actions(db: Session, user_email: str, limit: int = 100):
-        """Get recent actions by a specific user."""
-        return db.query(AuditLog).filter(
+    def get_user_actions(db: Session, user_email: str, limit: int = 100, cursor: str = None):
+        """Get recent actions by a specific user. Returns (logs, next_cursor)."""
+        return keyset_page(audit_files.live(db.query(AuditLog)).filter(
             AuditLog.performed_by == user_email
-        ).order_by(AuditLog.timestamp.desc()).limit(limit).all()
+        ), cursor, limit)
     
     @staticmethod
-    def get_recent_logs(db: Session, limit: int = 100):
-        """Get recent audit logs."""
-        return db.query(AuditLog).order_by(
-            AuditLog.timestamp.desc()
-        ).limit(limit).all()
+    def get_recent_logs(db: Session, limit: int = 100, cursor: str = None):
+        """Get recent audit logs. Returns (logs, next_cursor)."""
+        return keyset_page(audit_files.live(db.query(AuditLog)), cursor, limit)
     
     @staticmethod
-    def get_logs_by_action(db: Session, action: str, limit: int = 100):
-        """Get logs filtered by action type."""
-        return db.query(AuditLog).filter(
+    def get_logs_by_action(db: Session, action: str, limit: int = 100, cursor: str = None):
+        """Get logs filtered by action type. Returns (logs, next_cursor)."""
+        return keyset_page(audit_files.live(db.query(AuditLog)).filter(
             AuditLog.action == action
-        ).order_by(AuditLog.timestamp.desc()).limit(limit).all()
+        ), cursor, limit)
     
     @staticmethod
     def get_logs_by_entity(db: Session, entity: str, entity_id: str, 
-                          limit: int = 100):
-        """Get logs for a specific entity."""
-        return db.query(AuditLog).filter(
+                          limit: int = 100, cursor: str = None):
+        """Get logs for a specific entity. Returns (logs, next_cursor)."""
+        return keyset_page(audit_files.live(db.query(AuditLog)).filter(
             AuditLog.target_entity == entity,
             AuditLog.target_id == entity_id
-        ).order_by(AuditLog.timestamp.desc()).limit(limit).all()
+        ), cursor, limit)
 
 
 # Helper function to get client IP
@@ -8,7 +8,7 @@ Complete backend with authentication, tracking, and audit logging
 import os
 from datetime import datetime, timedelta, date  # ← ВОТ ЭТО
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Form, Depends, UploadFile, File, status, Request
+from fastapi import FastAPI, HTTPException, Form, Depends, UploadFile, File, status, Request, Response
 # ... остальные импорты
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
@@ -16,10 +16,7 @@ from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import or_, and_, func
-import shutil
-import pandas as pd
-from io import BytesIO
+from sqlalchemy import or_, and_, func, case
 
 # Rate limiting imports
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -32,7 +29,18 @@ from backend.models import Track, User, Warehouse, AuditLog
 import backend.crud as crud
 import backend.auth as auth
 from backend.schemas import UserRegister, UserLogin, Token, UserOut, TrackAssignment
-from backend.logger import AuditLogger, get_client_ip
+from backend.logger import AuditLogger, InvalidCursor, invalidate_warehouses, MAX_PAGE_SIZE, decode_cursor, encode_cursor, get_client_ip, keyset_page
+import backend.ingest as ingest
+import backend.jobs as jobs
+import backend.archive as archive
+import backend.personal_codes as personal_codes
+import backend.audit_sink as audit_sink
+import backend.audit_rollup as audit_rollup
+import backend.audit_search as audit_search
+import backend.audit_export as audit_export
+import backend.audit_files as audit_files
+from backend.cache import track_cache, track_key, invalidate_tracks, cached_stats, stats_cache
+from backend import statuses
 
 # ============================================================================
 # APPLICATION INITIALIZATION
@@ -44,6 +52,50 @@ def get_client_ip(request: Request) -> str:
         return forwarded.split(",")[0].strip()
     return request.client.host if request.client else "127.0.0.1"
 
+def status_code_or_400(text: str) -> int:
+    """Resolve a status text to its code, 400 for statuses not in track_statuses."""
+    try:
+        return statuses.code(text)
+    except statuses.UnknownStatus as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def audit_page_or_400(response: Response, fetch) -> list:
+    """
+    Run a keyset-paged audit query (fetch() -> (logs, next_cursor)).
+    The next cursor goes to the X-Next-Cursor header, a bad cursor is a 400.
+    """
+    try:
+        logs, next_cursor = fetch()
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return logs
+
+def segment_page(response: Response, logs: list, cursor: str, limit: int,
+                 start=None, end=None, predicate=None) -> list:
+    """
+    Continue a keyset page in the audit day segments (audit_files) once the
+    database part is exhausted (no X-Next-Cursor yet) and the range reaches
+    back into sealed days. Returns segment records and sets X-Next-Cursor if
+    more follow.
+    """
+    sealed = audit_files.sealed_through()
+    if not sealed or NEXT_CURSOR_HEADER in response.headers or (start and start.date() > sealed):
+        return []
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if logs:
+        before = (logs[-1].timestamp, logs[-1].id)
+    else:
+        before = decode_cursor(cursor) if cursor else None  # already validated by keyset_page
+    archived, more = audit_files.page(start, end, before, limit - len(logs), predicate)
+    if more:
+        last = (datetime.fromisoformat(archived[-1]["timestamp"]), archived[-1]["id"]) if archived else before
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*last)
+    return archived
+
 app = FastAPI(
     title="Delta Cargo Admin System",
     description="Cargo tracking and management system with audit logging",
@@ -62,6 +114,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Directory paths
@@ -83,6 +136,16 @@ def startup_event():
     """Initialize database on startup."""
     db.initialize_database()
     db.Base.metadata.create_all(bind=db.engine)
+    session = db.SessionLocal()
+    try:
+        statuses.seed(session)
+    finally:
+        session.close()
+    personal_codes.ensure_counter()
+    audit_search.ensure_index(db.engine)
+    archive.start_scheduler()
+    audit_files.start_scheduler()
+    audit_sink.start_writer()
     print("✅ [APP] FastAPI application started successfully")
     print(f"📁 [APP] Static files directory: {FRONTEND_SRC_DIR}")
     print(f"📁 [APP] Frontend directory: {FRONTEND_DIR}")
@@ -91,6 +154,10 @@ def startup_event():
 @app.on_event("shutdown")
 def shutdown_event():
     """Clean up database connections on shutdown."""
+    jobs.shutdown()
+    archive.stop_scheduler()
+    audit_files.stop_scheduler()
+    audit_sink.stop_writer()
     db.close_database()
     print("🛑 [APP] Application shutdown complete")
 
@@ -156,6 +223,7 @@ def create_warehouse(
     
     try:
         session.commit()
+        invalidate_warehouses()
         
         # Save all values immediately after commit
         wh_id = wh.id
@@ -304,10 +372,12 @@ async def assign_track(
             created_at=datetime.utcnow()
         )
         session.add(track)
+        crud.add_track_event(session, track, statuses.EVENT_CREATED, current_user.email)
         print(f"✅ [ASSIGN] Created: {track_number} with code={personal_code}")
     
     session.commit()
     session.refresh(track)
+    invalidate_tracks([track_number])
     
     print(f"✅ [ASSIGN] Saved to DB: track_number={track.track_number}, personal_code={track.personal_code}")
     
@@ -329,6 +399,7 @@ def delete_warehouse(
     # Удаляем без проверки
     session.delete(wh)
     session.commit()
+    invalidate_warehouses()
     
     print(f"✅ [WAREHOUSE] Deleted: {wh.name} (id={warehouse_id})")
     return {"success": True, "message": "Склад удалён"}
@@ -381,6 +452,7 @@ def update_warehouse(
     
     session.commit()
     session.refresh(wh)
+    invalidate_warehouses()
     
     # Log changes
     AuditLogger.log_action(
@@ -414,47 +486,41 @@ async def upload_excel(
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(400, "Only Excel files allowed")
     
+    path = None
     try:
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
+        path = await ingest.spool_upload(file)
+        rows = ingest.iter_rows(path, file.filename)
         
         # Validate columns
         required_cols = ['track_number', 'personal_code']
-        if not all(col in df.columns for col in required_cols):
+        header = [str(c).strip() if c is not None else '' for c in next(rows, ())]
+        if not all(col in header for col in required_cols):
             raise HTTPException(400, f"Excel must have columns: {required_cols}")
+        tn_idx = header.index('track_number')
+        code_idx = header.index('personal_code')
         
         added = 0
         errors = []
+        batch = []
         
-        for idx, row in df.iterrows():
-            try:
-                track_number = str(row['track_number']).strip()
-                personal_code = str(row['personal_code']).strip()
-                
-                if not track_number or track_number == 'nan':
-                    continue
-                
-                # Check if exists
-                existing = session.query(Track).filter(Track.track_number == track_number).first()
-                if existing:
-                    errors.append(f"Row {idx+2}: Track {track_number} already exists")
-                    continue
-                
-                # Create track
-                new_track = Track(
-                    track_number=track_number,        # ✅
-                    personal_code=personal_code,      # ✅
-                    current_status="В Китае",
-                    created_at=datetime.now()
-                )
-                
-                session.add(new_track)
-                added += 1
-                
-            except Exception as e:
-                errors.append(f"Row {idx+2}: {str(e)}")
+        def flush(batch):
+            result = crud.bulk_create_tracks(session, batch, "В Китае", current_user.email)
+            errors.extend(f"Track {tn} already exists" for tn in result["existing"])
+            return result["created"]
         
-        session.commit()
+        for row in rows:
+            track_number = ingest.normalize_track_number(row[tn_idx] if len(row) > tn_idx else None)
+            if not track_number:
+                continue
+            personal_code = ingest.cell_text(row[code_idx]) if len(row) > code_idx else None
+            batch.append((track_number, personal_code))
+            
+            if len(batch) >= ingest.BATCH_SIZE:
+                added += flush(batch)
+                batch = []
+        
+        if batch:
+            added += flush(batch)
         
         # ✅ ОБНОВЛЕНО: добавить склад в лог
         crud.log_action(
@@ -476,8 +542,12 @@ async def upload_excel(
             "errors": errors[:10]  # First 10 errors
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error processing file: {str(e)}")
+    finally:
+        ingest.remove_spooled(path)
     
 @app.post("/api/tracks/{track_number}/handout")
 def handout_track(
@@ -492,12 +562,12 @@ def handout_track(
     if not track:
         raise HTTPException(404, "Track not found")
     
-    Track.current_status = "Выдан"
-    track.handed_out_at = datetime.now()
-    track.handed_out_by = current_user.email
-    track.recipient_name = recipient_name
+    track.status_code = statuses.DELIVERED
+    track.handout_date = datetime.utcnow()
+    crud.add_track_event(session, track, statuses.EVENT_HANDOUT, current_user.email, note=recipient_name)
     
     session.commit()
+    invalidate_tracks([track.track_number])
     
     # ✅ Логировать выдачу
     crud.log_action(
@@ -528,10 +598,12 @@ def update_track(
     if not track:
         raise HTTPException(404, "Track not found")
     
-    old_status = Track.current_status
-    Track.current_status = status
+    old_status = track.current_status
+    track.status_code = status_code_or_400(status)
+    crud.add_track_event(session, track, statuses.EVENT_UPDATE, current_user.email)
     
     session.commit()
+    invalidate_tracks([track.track_number])
     
     # ✅ Логировать изменение
     crud.log_action(
@@ -697,46 +769,83 @@ def get_audit_logs(
     action: str = None,
     user: str = None,
     warehouse: str = None,
+    q: str = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: str = None,
+    response: Response = None,
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_superadmin)
 ):
-    """Get audit logs with filters."""
+    """
+    Get audit logs with filters, newest first.
+    Page with `cursor` (from the X-Next-Cursor header of the previous page);
+    `offset` is still accepted but gets slower the deeper it goes.
+    `q` is a full-text search (track number, phone, email, any word in details):
+    results come best match first and are paged with `offset`. Entries
+    already moved to day segments follow the database matches, newest first
+    (a plain word match there, no ranking).
+    """
     from datetime import datetime
     from sqlalchemy import or_, and_
     
     query = session.query(AuditLog)
+    start = datetime.fromisoformat(date_from) if date_from else None
+    end = datetime.fromisoformat(date_to) if date_to else None
+    # The same filters for entries already moved to day segments (audit_files)
+    checks = []
     
-    if date_from:
-        query = query.filter(AuditLog.timestamp >= datetime.fromisoformat(date_from))
+    if start:
+        query = query.filter(AuditLog.timestamp >= start)
     
-    if date_to:
-        query = query.filter(AuditLog.timestamp <= datetime.fromisoformat(date_to))
+    if end:
+        query = query.filter(AuditLog.timestamp <= end)
     
     if action:
         query = query.filter(AuditLog.action == action)
+        checks.append(lambda r: r["action"] == action)
     
     if user:
         query = query.filter(AuditLog.performed_by.ilike(f"%{user}%"))
+        checks.append(lambda r: user.lower() in (r["performed_by"] or "").lower())
     
-    # ✅ ИСПРАВЛЕНО: Фильтр по складу
+    # Фильтр по складу: indexed warehouse_id promoted from details at write time
     if warehouse:
-        # Ищем в details JSON по полям warehouse и branch
-        query = query.filter(
-            or_(
-                AuditLog.details.contains(f'"warehouse": "{warehouse}"'),
-                AuditLog.details.contains(f'"branch": "{warehouse}"'),
-                AuditLog.details.contains(f'"warehouse":"{warehouse}"'),
-                AuditLog.details.contains(f'"branch":"{warehouse}"')
+        wh = crud.find_warehouse(session, warehouse)
+        if wh:
+            query = query.filter(AuditLog.warehouse_id == wh.id)
+            checks.append(lambda r: r["warehouse_id"] == wh.id)
+        else:
+            query = query.filter(AuditLog.warehouse == warehouse)
+            checks.append(lambda r: r["warehouse"] == warehouse)
+    
+    # Days up to `sealed` live in segment files, their DB rows are on the way out
+    sealed = audit_files.sealed_through()
+    query = audit_files.live(query)
+    
+    archived = []
+    q = q.strip() if q else None
+    if q:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        matches = audit_search.ranked(query, q)
+        logs = matches.offset(offset).limit(limit).all()
+        # Database matches exhausted: go on with the segments, skipping what earlier pages showed there
+        if sealed and len(logs) < limit and (start is None or start.date() <= sealed):
+            skip = max(0, offset - matches.order_by(None).count()) if not logs else 0
+            checks.append(audit_files.text_predicate(q))
+            found, _ = audit_files.page(
+                start, end, None, skip + limit - len(logs), lambda r: all(check(r) for check in checks)
+            )
+            archived = found[skip:]
+    else:
+        logs = audit_page_or_400(response, lambda: keyset_page(query, cursor, limit, offset))
+        # Offset paging stays inside the database
+        if not offset:
+            archived = segment_page(
+                response, logs, cursor, limit, start, end, lambda r: all(check(r) for check in checks)
             )
-        )
-    
-    logs = query.order_by(AuditLog.timestamp.desc()).limit(limit).offset(offset).all()
-    
-    print(f"🔍 Logs query: warehouse={warehouse}, found={len(logs)}")
     
-    return [{
+    results = [{
         "id": log.id,
         "timestamp": log.timestamp.isoformat(),
         "action": log.action,
@@ -746,6 +855,22 @@ def get_audit_logs(
         "details": log.details,
         "ip_address": log.ip_address
     } for log in logs]
+    
+    results += [{
+        "id": r["id"],
+        "timestamp": r["timestamp"],
+        "action": r["action"],
+        "performed_by": r["performed_by"],
+        "target_entity": r["target_entity"],
+        "target_id": r["target_id"],
+        "details": r["details"],
+        "ip_address": r["ip_address"],
+        "archived": True
+    } for r in archived]
+    
+    print(f"🔍 Logs query: warehouse={warehouse}, q={q}, found={len(results)}")
+    
+    return results
 
 
 
@@ -762,21 +887,21 @@ def get_warehouse_stats(
     if not wh:
         raise HTTPException(status_code=404, detail="Warehouse not found")
     
-    # Count tracks
-    total_tracks = session.query(Track).filter(
-        Track.current_warehouse.ilike(f'%{warehouse_code}%')
-    ).count()
+    # Count tracks (indexed FK instead of ilike over the location text)
+    total_tracks = session.query(func.count(Track.id)).filter(
+        Track.current_warehouse_id == wh.id
+    ).scalar()
     
-    delivered = session.query(Track).filter(
-        Track.current_warehouse.ilike(f'%{warehouse_code}%'),
-        Track.current_status == "Выдан клиенту"
-    ).count()
+    delivered = session.query(func.count(Track.id)).filter(
+        Track.current_warehouse_id == wh.id,
+        Track.status_code == statuses.DELIVERED
+    ).scalar()
     
     in_transit = total_tracks - delivered
     
     # Count users
     users_count = session.query(User).filter(
-        func.or_(
+        or_(
             User.branch.ilike(f'%{wh.name}%'),
             User.assigned_warehouse == warehouse_code
         )
@@ -784,7 +909,7 @@ def get_warehouse_stats(
     
     # Recent activity
     recent_logs = session.query(AuditLog).filter(
-        AuditLog.details.ilike(f'%{warehouse_code}%')
+        AuditLog.warehouse_id == wh.id
     ).order_by(AuditLog.timestamp.desc()).limit(10).all()
     
     return {
@@ -859,17 +984,22 @@ def bulk_update_by_warehouse(
     
     if not warehouse_code or not new_status:
         raise HTTPException(status_code=400, detail="Missing parameters")
+    status_code = status_code_or_400(new_status)
     
-    tracks = session.query(Track).filter(
-        Track.current_warehouse.ilike(f'%{warehouse_code}%')
-    ).all()
+    wh = crud.find_warehouse(session, warehouse_code)
+    if not wh:
+        raise HTTPException(status_code=404, detail="Warehouse not found")
     
-    count = 0
-    for track in tracks:
-        Track.current_status = new_status
-        count += 1
+    count = session.query(Track).filter(
+        Track.current_warehouse_id == wh.id
+    ).update(
+        {Track.status_code: status_code, Track.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    crud.log_track_events(session, [Track.current_warehouse_id == wh.id], statuses.EVENT_BATCH, current_user.email)
     
     session.commit()
+    invalidate_tracks()
     
     AuditLogger.log_action(
         db=session,
@@ -922,18 +1052,23 @@ def get_active_warehouses(
     warehouses = session.query(Warehouse).filter(Warehouse.is_active == True).order_by(Warehouse.name.asc()).all()
     return [{"id": w.id, "name": w.name, "code": w.code, "address": w.address} for w in warehouses]
 
+@app.get("/api/statuses")
+def get_track_statuses(
+    current_user: User = Depends(auth.get_current_active_user)
+):
+    """Known track statuses with their codes."""
+    return statuses.all_statuses()
+
 @app.post("/api/tracks/upload")
 async def upload_tracks(
     request: Request,  # ← ДОБАВЬ ЭТУ СТРОКУ!
     file: UploadFile = File(...),
-    departuredate: str = Form(...),
-    status: str = Form(...),
+    china_departure: str = Form(...),
+    current_status: str = Form(...),
+    warehouse: str = Form(...),
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_admin)
 ):
-    """Upload tracks from Excel/CSV file."""
-    # ... остальной код
-
     """Upload tracks from file with warehouse assignment."""
     if not warehouse:
         raise HTTPException(status_code=400, detail="Warehouse is required")
@@ -941,43 +1076,25 @@ async def upload_tracks(
     wh = session.query(Warehouse).filter(Warehouse.code == warehouse.upper()).first()
     if not wh:
         raise HTTPException(status_code=404, detail="Warehouse not found")
+    status_code_or_400(current_status)
 
     try:
-        contents = await file.read()
-        
-        # Parse file based on type
-        if file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(BytesIO(contents), header=None)
-        elif file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(contents), header=None)
-        else:
-            # Plain text file
-            track_numbers = contents.decode('utf-8').splitlines()
-            df = pd.DataFrame(track_numbers)
-
-        track_numbers = df[0].dropna().astype(str).str.strip().str.upper()
-        
-        count = 0
-        for tn in track_numbers:
-            if tn and tn != 'NAN':
-                track = crud.create_or_update_track(
-                    session, tn, status,
-                    datetime.strptime(departure_date, '%Y-%m-%d').date()
-                )
-                track.current_warehouse = f"{wh.name} ({wh.code})"
-                count += 1
+        departure_dt = datetime.strptime(china_departure, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-        session.commit()
-        
-        AuditLogger.log_tracks_uploaded(
-            session, current_user, count, file.filename,
-            ip_address=get_client_ip(request)
-        )
+    # Import runs in the background, the client polls /api/jobs/{id}
+    path = await ingest.spool_upload(file)
+    result = jobs.submit_import(
+        session, path, file.filename, current_status, departure_dt,
+        admin=current_user, ip_address=get_client_ip(request),
+        extra={"current_warehouse_id": wh.id, "current_warehouse": crud.warehouse_label(wh)}
+    )
 
-        return {"success": True, "imported": count, "updated": count}
-    except Exception as e:
-        session.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(
+        status_code=200 if result["duplicate"] else 202,
+        content={"success": True, **result}
+    )
 
     
 @app.post("/api/tracks/batch-update-status")
@@ -995,8 +1112,10 @@ def batch_update_status(
     if not date_str or not new_status:
         raise HTTPException(status_code=400, detail="departure_date and new_status required")
 
-    targetdate = datetime.strptime(date, '%Y-%m-%d').date()
-    tracks = session.query(Track).filter(Track.china_departure == target_date).all()
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
     wh = None
     if warehouse_code:
@@ -1004,14 +1123,13 @@ def batch_update_status(
         if not wh:
             raise HTTPException(status_code=404, detail="Warehouse not found")
 
-    updated = 0
-    for t in tracks:
-        t.status = new_status
-        if wh:
-            t.current_warehouse = f"{wh.name} ({wh.code})"
-        updated += 1
+    values = {"status_code": status_code_or_400(new_status)}
+    if wh:
+        values.update(current_warehouse_id=wh.id, current_warehouse=crud.warehouse_label(wh))
 
-    session.commit()
+    # One indexed UPDATE on china_departure instead of loading every track
+    updated = crud.update_tracks_by_departure(session, target_date, values, current_user.email)
+    invalidate_tracks()
     
     AuditLogger.log_action(
         session, "BATCH_STATUS_UPDATE", current_user.email, "track",
@@ -1240,74 +1358,39 @@ async def upload_tracks(
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_admin)
 ):
-    """Upload tracks from Excel/CSV file."""
-    count = 0
-    errors = []
-    
+    """
+    Upload tracks from Excel/CSV file.
+    The import runs as a background job; poll /api/jobs/{job_id} for progress.
+    An identical re-upload returns the earlier result with duplicate=true.
+    """
     try:
-        # Parse the date
         departure_dt = datetime.strptime(departuredate, '%Y-%m-%d').date()
-        
-        # Read file contents
-        contents = await file.read()
-        
-        # Parse based on file type
-        if file.filename.endswith('.xlsx') or file.filename.endswith('.xls'):
-            df = pd.read_excel(BytesIO(contents), header=None)
-        elif file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(contents), header=None)
-        else:
-            # Treat as plain text file
-            track_numbers = contents.decode('utf-8').splitlines()
-            df = pd.DataFrame(track_numbers)
-        
-        # Extract track numbers from first column
-        track_numbers = df[0].dropna().astype(str).str.strip().str.upper()
-        
-        # Process each track number
-        for track_number in track_numbers:
-            if track_number and track_number != 'NAN':
-                try:
-                    # Check if track already exists
-                    existing = session.query(Track).filter(
-                        Track.track_number == track_number
-                    ).first()
-                    
-                    if existing:
-                        # Update existing track
-                        existing.current_status = status
-                        existing.china_departure = departure_dt
-                    else:
-                        # Create new track
-                        newtrack = Track(
-                            track_number=track_number,
-                            current_status=status,
-                            china_departure=departure_dt
-                        )
-                        session.add(newtrack)
-                        count += 1
-                        
-                except Exception as e:
-                    errors.append(f"{track_number}: {str(e)}")
-        
-        session.commit()
-        
-        # Log tracks upload
-        AuditLogger.log_tracks_uploaded(
-            db=session,
-            admin=current_user,
-            count=count,
-            filename=file.filename,
-            ip_address=get_client_ip(request)
-        )
-        
-        print(f"✅ [TRACKS] Uploaded {count} tracks by {current_user.email}")
-        return {"success": True, "count": count, "errors": errors}
-        
-    except Exception as e:
-        session.rollback()
-        print(f"❌ [TRACKS] Upload error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    status_code_or_400(status)
+    
+    # Spool the upload to disk, the job streams it in batches and removes it
+    path = await ingest.spool_upload(file)
+    result = jobs.submit_import(
+        session, path, file.filename, status, departure_dt,
+        admin=current_user, ip_address=get_client_ip(request)
+    )
+    
+    return JSONResponse(
+        status_code=200 if result["duplicate"] else 202,
+        content={"success": True, **result}
+    )
+
+@app.get("/api/jobs/{job_id}")
+def get_import_job(
+    job_id: str,
+    current_user: User = Depends(auth.require_admin)
+):
+    """Get progress of a background import job."""
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @app.get("/api/tracks/search/{track_number}")
 def search_track(
@@ -1317,40 +1400,200 @@ def search_track(
 ):
     """
     Search for a specific track by track number.
-    Returns track details or 404.
+    Returns track details or 404. Results (including misses) are cached
+    in process and invalidated by every write path that touches tracks.
     """
-    track = session.query(Track).filter(
-        Track.track_number == track_number.upper()
-    ).first()
-
-    if not track:
+    key = track_key(track_number)
+
+    def load():
+        track = session.query(Track).filter(Track.track_number == key).first()
+        archived = track is None
+        if archived:
+            # Handed-out parcels move to tracks_archive after a while
+            track = crud.get_archived_track(session, key)
+        return {
+            "id": track.id,
+            "track_number": track.track_number,
+            "status": track.current_status,
+            "personal_code": track.personal_code,
+            "departuredate": track.china_departure.isoformat() if track.china_departure else None,
+            "arrivaldate": track.kz_arrival.isoformat() if track.kz_arrival else None,
+            "currentwarehouse": track.current_warehouse,
+            "archived": archived
+        } if track else None
+
+    # A write that invalidates while load() runs keeps its (possibly older) row out of the cache
+    result = track_cache.get_or_compute(key, load)
+
+    if not result:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    return {
-        "id": track.id,
-        "track_number": track.track_number,
-        "status": Track.current_status,
-        "personal_code": track.personal_code,
-        "departuredate": Track.china_departure.isoformat() if Track.china_departure else None,
-        "arrivaldate": track.arrival_date.isoformat() if track.arrival_date else None,
-        "currentwarehouse": track.current_warehouse
-    }
+    return result
+
+MIN_PARTIAL_SEARCH = 3
+MAX_PARTIAL_RESULTS = 50
+
+@app.get("/api/tracks/search")
+def search_tracks_partial(
+    q: str,
+    mode: str = "auto",
+    limit: int = 20,
+    session: Session = Depends(db.get_db),
+    current_user: User = Depends(auth.require_admin)
+):
+    """
+    Partial track search for damaged labels (admin only).
+    mode: prefix, suffix or auto (both). Matches are ranked exact > prefix > suffix.
+    """
+    fragment = track_key(q)
+    if len(fragment) < MIN_PARTIAL_SEARCH:
+        raise HTTPException(status_code=400, detail=f"Enter at least {MIN_PARTIAL_SEARCH} characters")
+    if mode not in ("auto", "prefix", "suffix"):
+        raise HTTPException(status_code=400, detail="mode must be auto, prefix or suffix")
+
+    matches = crud.search_tracks_partial(session, fragment, mode, min(max(limit, 1), MAX_PARTIAL_RESULTS))
+
+    return [{
+        "match": match,
+        "id": t.id,
+        "track_number": t.track_number,
+        "status": statuses.name(t.status_code),
+        "personal_code": t.personal_code,
+        "departuredate": t.china_departure.isoformat() if t.china_departure else None
+    } for match, t in matches]
+
+@app.get("/api/cache/stats")
+def get_cache_stats(
+    current_user: User = Depends(auth.require_superadmin)
+):
+    """Hit/miss counters of the in-process caches (superadmin only)."""
+    return {"tracks": track_cache.stats(), "stats": stats_cache.stats()}
+
+@app.post("/api/tracks/archive/run")
+def run_track_archival(
+    request: Request,
+    older_than_days: int = Form(archive.ARCHIVE_AFTER_DAYS),
+    session: Session = Depends(db.get_db),
+    current_user: User = Depends(auth.require_superadmin)
+):
+    """Move tracks handed out more than `older_than_days` ago to tracks_archive now (superadmin only)."""
+    if older_than_days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+    moved = archive.archive_handed_out(session, older_than_days)
+
+    AuditLogger.log_action(
+        db=session,
+        action="ARCHIVE_TRACKS",
+        performed_by=current_user.email,
+        target_entity="track",
+        details={"count": moved, "older_than_days": older_than_days},
+        ip_address=get_client_ip(request)
+    )
+    return {"success": True, "archived": moved}
+
+@app.post("/api/audit/retention/run")
+def run_audit_retention(
+    request: Request,
+    older_than_days: int = Form(audit_files.AUDIT_RETENTION_DAYS),
+    session: Session = Depends(db.get_db),
+    current_user: User = Depends(auth.require_superadmin)
+):
+    """Move audit entries older than `older_than_days` to day segment files now (superadmin only)."""
+    if older_than_days < 1:
+        raise HTTPException(status_code=400, detail="older_than_days must be at least 1")
+    moved = audit_files.seal_old_logs(older_than_days)
+
+    AuditLogger.log_action(
+        db=session,
+        action="AUDIT_RETENTION",
+        performed_by=current_user.email,
+        target_entity="audit_logs",
+        details={"count": moved, "older_than_days": older_than_days},
+        ip_address=get_client_ip(request),
+        sync=True
+    )
+    return {"success": True, "moved": moved, "sealed_through": audit_files.load_index()["sealed_through"]}
+
+def status_timeline(t) -> list:
+    """Four-step client timeline from the fixed date columns of a track row."""
+    return [
+        {"status": "Китай", "date": t.china_arrival.strftime('%d.%m.%Y') if t.china_arrival else "—", "completed": bool(t.china_arrival)},
+        {"status": "Отправлено", "date": t.china_departure.strftime('%d.%m.%Y') if t.china_departure else "—", "completed": bool(t.china_departure)},
+        {"status": "Склад", "date": t.kz_arrival.strftime('%d.%m.%Y') if t.kz_arrival else "—", "completed": bool(t.kz_arrival)},
+        {"status": "Выдано", "date": t.handout_date.strftime('%d.%m.%Y') if t.handout_date else "—", "completed": bool(t.handout_date)}
+    ]
+
+STAFF_ROLES = ("admin", "warehouse_admin", "superadmin")
+
+def track_history(events, user: User = None) -> list:
+    """
+    Event rows from crud.tracks_with_history in timeline item format.
+    `note` (handout recipient, transfer route) only goes to staff: any
+    active user can look up any track number.
+    """
+    staff = user is not None and user.role in STAFF_ROLES
+    return [{
+        "status": statuses.name(e.event_status_code),
+        "date": e.event_ts.strftime('%d.%m.%Y %H:%M'),
+        "completed": True,
+        "kind": e.event_kind,
+        "warehouse": e.event_warehouse,
+        **({"note": e.event_note} if staff else {})
+    } for e in events]
 
 @app.get("/api/users/{user_identifier}/tracks")
 def get_user_tracks_simple(user_identifier: str, session: Session = Depends(db.get_db), current_user: User = Depends(auth.get_current_user)):
     try:
         print(f"🔹 Looking for tracks: {user_identifier}")
-        tracks = session.query(Track).filter(Track.personal_code == user_identifier).all()
+        # Tracks and their whole event history in one query
+        tracks = crud.tracks_with_history(session, Track.personal_code == user_identifier)
         print(f"✅ Found: {len(tracks)}")
         result = []
-        for t in tracks:
-            result.append({"track_number": t.track_number, "current_status": t.current_status or "Ожидание", "personal_code": t.personal_code, "is_assigned": True, "status_timeline": [{"status": "Китай", "date": t.china_arrival.strftime('%d.%m.%Y') if t.china_arrival else "—", "completed": bool(t.china_arrival)}, {"status": "Отправлено", "date": t.china_departure.strftime('%d.%m.%Y') if t.china_departure else "—", "completed": bool(t.china_departure)}, {"status": "Склад", "date": t.kz_arrival.strftime('%d.%m.%Y') if t.kz_arrival else "—", "completed": bool(t.kz_arrival)}, {"status": "Выдано", "date": t.handout_date.strftime('%d.%m.%Y') if t.handout_date else "—", "completed": bool(t.handout_date)}]})
+        for t, events in tracks:
+            result.append({"track_number": t.track_number, "current_status": statuses.name(t.status_code) or "Ожидание", "personal_code": t.personal_code, "is_assigned": True, "status_timeline": status_timeline(t), "history": track_history(events, current_user)})
         return result
     except Exception as e:
         print(f"❌ Error: {e}")
         return []
 
 
+MAX_LOOKUP_TRACKS = 500
+
+@app.post("/api/tracks/lookup")
+def lookup_tracks(
+    payload: dict,
+    session: Session = Depends(db.get_db),
+    current_user: User = Depends(auth.get_current_active_user)
+):
+    """
+    Look up many track numbers in one round trip.
+    Body: {"track_numbers": [...]} (a comma/space separated string also works).
+    """
+    raw = payload.get("track_numbers") or []
+    if isinstance(raw, str):
+        raw = raw.replace(",", " ").replace(";", " ").split()
+    numbers = list(dict.fromkeys(track_key(str(tn)) for tn in raw if track_key(str(tn))))
+
+    if not numbers:
+        raise HTTPException(status_code=400, detail="track_numbers required")
+    if len(numbers) > MAX_LOOKUP_TRACKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_TRACKS} track numbers per request")
+
+    rows = crud.lookup_tracks(session, numbers)
+
+    return {
+        "found": [{
+            "track_number": t.track_number,
+            "current_status": statuses.name(t.status_code) or "Ожидание",
+            "personal_code": t.personal_code,
+            "is_assigned": bool(t.personal_code),
+            "status_timeline": status_timeline(t),
+            "history": track_history(events, current_user)
+        } for t, events in (rows[tn] for tn in numbers if tn in rows)],
+        "not_found": [tn for tn in numbers if tn not in rows]
+    }
+
+
 
 @app.post("/api/tracks/deliver-batch")
 def deliver_batch(
@@ -1360,26 +1603,13 @@ def deliver_batch(
     current_user: User = Depends(auth.require_admin)
 ):
     """Mark multiple tracks as delivered to client."""
-    delivered = []
-    errors = []
-
     tracks_list = [t.strip().upper() for t in track_numbers.split(",") if t.strip()]
 
-    for tn in tracks_list:
-        # ✅ ИСПРАВЛЕНО: track_number вместо track_number
-        track = session.query(Track).filter(Track.track_number == tn).first()
-        if track:
-            Track.current_status = "Выдан клиенту"
-            track.handout_date = datetime.utcnow()
-            track.handed_by = current_user.email
-            delivered.append(tn)
-        else:
-            errors.append(tn)
-
-    session.commit()
-
-    # Логирование
     try:
+        # Chunked UPDATE ... WHERE track_number IN (...) plus the audit entry,
+        # committed together
+        delivered, errors = crud.deliver_tracks(session, tracks_list, performed_by=current_user.email)
+
         crud.log_action(
             session=session,
             action="BATCH_DELIVER",
@@ -1393,10 +1623,16 @@ def deliver_batch(
                 "errors": errors[:10],
                 "errors_count": len(errors)
             },
-            ip_address=get_client_ip(request)
+            ip_address=get_client_ip(request),
+            commit=False
         )
+        session.commit()
     except Exception as e:
-        print(f"⚠️ Failed to log: {e}")
+        session.rollback()
+        print(f"❌ [TRACKS] Batch deliver failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch deliver failed: {str(e)}")
+
+    invalidate_tracks(delivered)
 
     print(f"✅ [TRACKS] Delivered {len(delivered)} parcels by {current_user.email}")
 
@@ -1410,22 +1646,31 @@ def deliver_batch(
 @app.post("/api/tracks/delete-batch")
 def delete_batch_tracks(
     request: Request,
-    track_numbers: str = Form(...),
+    track_numbers: str = Form(None),
+    china_departure: str = Form(None),
+    status: str = Form(None),
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_admin)
 ):
-    """Delete multiple tracks at once."""
-    track_list = [t.strip().upper() for t in track_numbers.split(',') if t.strip()]
-    deleted = []
-
-    for track_number in track_list:
-        # ✅ ИСПРАВЛЕНО: Track.track_number
-        track = session.query(Track).filter(Track.track_number == track_number).first()
-        if track:
-            session.delete(track)
-            deleted.append(track_number)
+    """
+    Delete multiple tracks at once.
+    Either a comma-separated list of numbers, or a filter by departure
+    date (YYYY-MM-DD) and/or status. Dependent transfers are deleted too.
+    """
+    track_list = [t.strip().upper() for t in (track_numbers or "").split(',') if t.strip()]
 
-    session.commit()
+    try:
+        if track_list:
+            result = crud.delete_tracks(session, track_list)
+        elif china_departure or status:
+            departure_dt = datetime.strptime(china_departure, '%Y-%m-%d').date() if china_departure else None
+            result = crud.delete_tracks_by_filter(session, departure_dt, status)
+        else:
+            raise HTTPException(status_code=400, detail="track_numbers or a filter (china_departure, status) is required")
+    except statuses.UnknownStatus as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
     # Логирование
     try:
@@ -1434,20 +1679,26 @@ def delete_batch_tracks(
             action="BATCH_DELETE",
             performed_by=current_user.email,
             details={
-                "count": len(deleted),
+                "count": result["deleted"],
                 "warehouse": current_user.branch,
                 "branch": current_user.branch,
-                "tracks": deleted[:20],
-                "total_tracks": len(deleted)
+                "tracks": result["tracks"][:20],
+                "total_tracks": result["deleted"],
+                "transfers_deleted": result["transfers_deleted"],
+                "filter": {"china_departure": china_departure, "status": status} if not track_list else None
             },
             ip_address=get_client_ip(request)
         )
     except Exception as e:
         print(f"⚠️ Failed to log: {e}")
 
-    print(f"✅ [TRACKS] Deleted {len(deleted)} tracks by {current_user.email}")
+    print(f"✅ [TRACKS] Deleted {result['deleted']} tracks by {current_user.email}")
 
-    return {"success": True, "deleted": len(deleted)}
+    return {
+        "success": True,
+        "deleted": result["deleted"],
+        "transfers_deleted": result["transfers_deleted"]
+    }
 
 @app.post("/api/auth/register")
 async def register(
@@ -1494,7 +1745,7 @@ async def register(
         new_user.branch = branch
         new_user.role = "client"
         new_user.is_active = True
-        new_user.personal_code = None
+        new_user.personal_code = crud.get_next_personal_code(session)
         new_user.assigned_warehouse = None
         new_user.created_at = datetime.utcnow()
         new_user.last_login = None
@@ -1549,17 +1800,19 @@ def calendar_events(
     """
     results = session.query(
         Track.china_departure,
-        func.count(Track.id).label("count")
+        func.count(Track.id).label("count"),
+        func.sum(case((Track.status_code == statuses.DELIVERED, 1), else_=0)).label("delivered")
     ).filter(
         Track.china_departure.isnot(None)
     ).group_by(Track.china_departure).all()
 
     events = []
-    for departure_date, count in results:
+    for departure_date, count, delivered in results:
         events.append({
             "title": f"{count} посылок",
             "start": departure_date.isoformat(),
             "count": count,
+            "delivered": delivered or 0,
             "backgroundColor": "#667eea",
             "borderColor": "#667eea"
         })
@@ -1605,18 +1858,13 @@ def batch_update_tracks(
     Frontend sends: date, newstatus
     """
     try:
-        targetdate = datetime.strptime(date, '%Y-%m-%d').date()
-
-        tracks = session.query(Track).filter(
-            Track.china_departure == target_date
-        ).all()
-
-        count = 0
-        for track in tracks:
-            Track.current_status = newstatus
-            count += 1
+        target_date = datetime.strptime(date, '%Y-%m-%d').date()
 
-        session.commit()
+        # One indexed UPDATE on china_departure instead of loading every track
+        count = crud.update_tracks_by_departure(
+            session, target_date, {"status_code": status_code_or_400(newstatus)}, current_user.email
+        )
+        invalidate_tracks()
 
         # Log batch status update
         AuditLogger.log_action(
@@ -1715,17 +1963,19 @@ def create_warehouse(
 def get_audit_logs(
     limit: int = 100,
     action: Optional[str] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_superadmin)
 ):
     """
     Get audit logs (superadmin only).
-    Optional filter by action type.
+    Optional filter by action type. Paged by `cursor` (X-Next-Cursor).
     """
     if action:
-        logs = AuditLogger.get_logs_by_action(session, action, limit)
+        logs = audit_page_or_400(response, lambda: AuditLogger.get_logs_by_action(session, action, limit, cursor))
     else:
-        logs = AuditLogger.get_recent_logs(session, limit)
+        logs = audit_page_or_400(response, lambda: AuditLogger.get_recent_logs(session, limit, cursor))
 
     return [{
         "id": log.id,
@@ -1742,11 +1992,13 @@ def get_audit_logs(
 def get_user_audit_logs(
     email: str,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    response: Response = None,
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_admin)
 ):
     """
-    Get audit logs for a specific user.
+    Get audit logs for a specific user, paged by `cursor` (X-Next-Cursor).
     Admin can view, but only their own unless superadmin.
     """
     if current_user.role != "superadmin" and current_user.email != email:
@@ -1755,7 +2007,8 @@ def get_user_audit_logs(
             detail="Can only view your own logs"
         )
 
-    logs = AuditLogger.get_user_actions(session, email, limit)
+    logs = audit_page_or_400(response, lambda: AuditLogger.get_user_actions(session, email, limit, cursor))
+    archived = segment_page(response, logs, cursor, limit, predicate=lambda r: r["performed_by"] == email)
 
     return [{
         "id": log.id,
@@ -1765,20 +2018,38 @@ def get_user_audit_logs(
         "details": log.details,
         "ip_address": log.ip_address,
         "timestamp": log.timestamp.isoformat() if log.timestamp else None
-    } for log in logs]
+    } for log in logs] + [{
+        "id": r["id"],
+        "action": r["action"],
+        "target_entity": r["target_entity"],
+        "target_id": r["target_id"],
+        "details": r["details"],
+        "ip_address": r["ip_address"],
+        "timestamp": r["timestamp"],
+        "archived": True
+    } for r in archived]
 
 @app.get("/api/audit/logs/entity/{entity}/{entity_id}")
 def get_entity_audit_logs(
     entity: str,
     entity_id: str,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    response: Response = None,
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_admin)
 ):
     """
-    Get audit logs for a specific entity (track, user, warehouse).
+    Get audit logs for a specific entity (track, user, warehouse),
+    paged by `cursor` (X-Next-Cursor).
     """
-    logs = AuditLogger.get_logs_by_entity(session, entity, entity_id, limit)
+    logs = audit_page_or_400(
+        response, lambda: AuditLogger.get_logs_by_entity(session, entity, entity_id, limit, cursor)
+    )
+    archived = segment_page(
+        response, logs, cursor, limit,
+        predicate=lambda r: r["target_entity"] == entity and r["target_id"] == entity_id
+    )
 
     return [{
         "id": log.id,
@@ -1787,37 +2058,84 @@ def get_entity_audit_logs(
         "details": log.details,
         "ip_address": log.ip_address,
         "timestamp": log.timestamp.isoformat() if log.timestamp else None
-    } for log in logs]
+    } for log in logs] + [{
+        "id": r["id"],
+        "action": r["action"],
+        "performed_by": r["performed_by"],
+        "details": r["details"],
+        "ip_address": r["ip_address"],
+        "timestamp": r["timestamp"],
+        "archived": True
+    } for r in archived]
 
 @app.get("/api/audit/stats")
 def get_audit_stats(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_superadmin)
 ):
     """
-    Get audit statistics (superadmin only).
+    Get audit statistics (superadmin only), from the daily rollup.
+    Optional inclusive day range: date_from / date_to as YYYY-MM-DD.
+    """
+    try:
+        day_from = date.fromisoformat(date_from[:10]) if date_from else None
+        day_to = date.fromisoformat(date_to[:10]) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    return audit_rollup.get_stats(session, day_from, day_to)
+
+@app.get("/api/audit/export")
+def export_audit_logs(
+    request: Request,
+    date_from: str,
+    date_to: str,
+    format: str = "ndjson",
+    gzip: bool = False,
+    current_user: User = Depends(auth.require_superadmin)
+):
+    """
+    Stream audit logs for a date range as NDJSON or CSV (superadmin only).
+    date_from / date_to: YYYY-MM-DD (date_to inclusive) or ISO datetimes.
+    gzip=true sends a .gz file. Memory use does not depend on the range.
     """
-    total_logs = session.query(func.count(AuditLog.id)).scalar()
-
-    # Actions by type
-    action_counts = session.query(
-        AuditLog.action,
-        func.count(AuditLog.id).label('count')
-    ).group_by(AuditLog.action).all()
-
-    # Most active users
-    user_counts = session.query(
-        AuditLog.performed_by,
-        func.count(AuditLog.id).label('count')
-    ).group_by(AuditLog.performed_by).order_by(
-        func.count(AuditLog.id).desc()
-    ).limit(10).all()
+    from fastapi.responses import StreamingResponse
 
-    return {
-        "total_logs": total_logs,
-        "actions": [{"action": a, "count": c} for a, c in action_counts],
-        "most_active_users": [{"email": u, "actions": c} for u, c in user_counts]
-    }
+    if format not in audit_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(audit_export.FORMATS)}")
+    try:
+        start = datetime.fromisoformat(date_from)
+        end = datetime.fromisoformat(date_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if len(date_to) == 10:
+        end += timedelta(days=1)  # whole last day
+
+    session = db.SessionLocal()
+    try:
+        AuditLogger.log_action(
+            db=session,
+            action="EXPORT_AUDIT_LOGS",
+            performed_by=current_user.email,
+            target_entity="audit_logs",
+            details={"date_from": date_from, "date_to": date_to, "format": format, "gzip": gzip},
+            ip_address=get_client_ip(request),
+            sync=True
+        )
+    finally:
+        session.close()
+
+    media_type, extension = audit_export.FORMATS[format]
+    filename = f"audit_logs_{date_from[:10]}_{date_to[:10]}.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        audit_export.stream(start, end, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 # ============================================================================
 # STATISTICS ENDPOINT
@@ -1828,21 +2146,24 @@ def get_statistics(
     session: Session = Depends(db.get_db),
     current_user: User = Depends(auth.require_admin)
 ):
-    """Get system statistics (admin only)."""
-    total_users = session.query(func.count(User.id)).scalar()
-    total_tracks = session.query(func.count(Track.id)).scalar()
-    delivered_tracks = session.query(func.count(Track.id)).filter(
-        Track.current_status == "Выдан клиенту"
-    ).scalar()
-    total_warehouses = session.query(func.count(Warehouse.id)).scalar()
+    """
+    Get system statistics (admin only).
+    One aggregate query, cached for STATS_CACHE_TTL seconds and shared by
+    concurrent requests; bulk track writes drop the cached copy.
+    """
+    def compute():
+        total_users, total_tracks, delivered_tracks, total_warehouses = session.execute(
+            crud.statistics_query()
+        ).one()
+        return {
+            "total_users": total_users,
+            "total_tracks": total_tracks,
+            "delivered_tracks": delivered_tracks,
+            "in_transit": total_tracks - delivered_tracks,
+            "total_warehouses": total_warehouses
+        }
 
-    return {
-        "total_users": total_users,
-        "total_tracks": total_tracks,
-        "delivered_tracks": delivered_tracks,
-        "in_transit": total_tracks - delivered_tracks,
-        "total_warehouses": total_warehouses
-    }
+    return cached_stats(compute)
 
 # ============================================================================
 # HEALTH CHECK
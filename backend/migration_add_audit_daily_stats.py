@@ -0,0 +1,43 @@
+# migration_add_audit_daily_stats.py
+"""
+Migration: audit_daily_stats rollup for /api/audit/stats.
+Creates the table and counts every existing audit_logs row into it
+(rebuild() replaces the counters, so re-running gives the same result).
+Stop the app while it runs, or entries written meanwhile may be counted twice.
+Run once: python -m backend.migration_add_audit_daily_stats
+"""
+
+from backend.db import SessionLocal, engine
+from backend.models import AuditDailyStat
+from backend import audit_rollup
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Дневная статистика аудита (audit_daily_stats)")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        print("\n1. Таблица audit_daily_stats...")
+        AuditDailyStat.__table__.create(bind=engine, checkfirst=True)
+        print("   ✓ Готово")
+
+        print("\n2. Подсчёт существующих записей audit_logs...")
+        total = audit_rollup.rebuild(db)
+        rows = db.query(AuditDailyStat).count()
+        print(f"   ✓ {total} записей → {rows} строк статистики")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
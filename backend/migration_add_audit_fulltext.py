@@ -0,0 +1,70 @@
+# migration_add_audit_fulltext.py
+"""
+Migration: full-text index over audit logs.
+SQLite: details stored with \\uXXXX escapes (written before
+db._json_serializer) are rewritten as plain UTF-8 first, then the FTS5 table
+audit_logs_fts + triggers are created and filled from existing rows.
+PostgreSQL: generated tsvector column audit_logs.search_tsv + GIN index
+(adding the column rewrites the table - run it in a quiet window).
+Run once: python -m backend.migration_add_audit_fulltext
+"""
+
+import json
+
+from sqlalchemy import text
+
+from backend.db import engine
+from backend import audit_search
+
+BATCH_SIZE = 1000
+
+
+def unescape_details() -> int:
+    """Rewrite SQLite details JSON that has \\uXXXX escapes with ensure_ascii=False. Returns rows changed."""
+    changed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, details FROM audit_logs "
+                "WHERE id > :last AND details LIKE '%\\u%' ORDER BY id LIMIT :n"
+            ), {"last": last_id, "n": BATCH_SIZE}).all()
+            if not rows:
+                return changed
+            for log_id, raw in rows:
+                try:
+                    value = json.dumps(json.loads(raw), ensure_ascii=False)
+                except ValueError:
+                    continue
+                if value != raw:
+                    conn.execute(text("UPDATE audit_logs SET details = :d WHERE id = :id"), {"d": value, "id": log_id})
+                    changed += 1
+            last_id = rows[-1].id
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Полнотекстовый поиск по журналу аудита")
+    print("=" * 80)
+
+    try:
+        if engine.dialect.name == "sqlite":
+            print("\n1. Экранированные \\uXXXX в details...")
+            print(f"   ✓ Переписано записей: {unescape_details()}")
+
+        created = audit_search.ensure_index(engine)
+        if engine.dialect.name == "postgresql":
+            name = f"audit_logs.{audit_search.TSV_COLUMN} + {audit_search.TSV_INDEX}"
+        else:
+            name = audit_search.FTS_TABLE
+        print(f"   ✓ {name} {'создан' if created else 'уже существует'}")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,34 @@
+# migration_add_departure_index.py
+"""
+Migration: index on tracks.china_departure.
+Batch status updates and the calendar filter by departure day.
+Run once: python -m backend.migration_add_departure_index
+"""
+
+from sqlalchemy import text
+
+from backend.db import SessionLocal
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Индекс по дате отправки из Китая")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_tracks_china_departure ON tracks (china_departure)"))
+        db.commit()
+        print("✅ Индекс ix_tracks_china_departure готов")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
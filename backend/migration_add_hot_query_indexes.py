@@ -0,0 +1,44 @@
+# migration_add_hot_query_indexes.py
+"""
+Migration: composite indexes for the hot filters.
+tracks: (personal_code, is_active), created_at
+audit_logs: timestamp, (action, timestamp), (performed_by, timestamp),
+            (target_entity, target_id, timestamp)
+Definitions live in models.py __table_args__, this creates the missing ones.
+Run once: python -m backend.migration_add_hot_query_indexes
+Check plans afterwards: python -m backend.check_query_plans
+"""
+
+from backend.db import engine
+from backend.models import Track, AuditLog
+
+INDEXES = {
+    Track: ("ix_tracks_personal_code_active", "ix_tracks_created_at"),
+    AuditLog: ("ix_audit_logs_timestamp", "ix_audit_logs_action_timestamp",
+               "ix_audit_logs_performed_by_timestamp", "ix_audit_logs_target_timestamp"),
+}
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Составные индексы для частых запросов")
+    print("=" * 80)
+
+    try:
+        for model, names in INDEXES.items():
+            for index in model.__table__.indexes:
+                if index.name not in names:
+                    continue
+                # checkfirst: indexes already created by create_all are skipped
+                index.create(bind=engine, checkfirst=True)
+                print(f"   ✓ {index.name}")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,29 @@
+# migration_add_personal_code_counter.py
+"""
+Migration: personal code sequence / counter.
+PostgreSQL: creates personal_code_seq starting after the largest numeric code.
+SQLite: creates personal_code_counter and seeds its single row the same way.
+The app also does this on startup; running it once up front avoids the
+users scan during the first registration.
+Run once: python -m backend.migration_add_personal_code_counter
+"""
+
+from backend import personal_codes
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Счётчик персональных кодов")
+    print("=" * 80)
+
+    try:
+        personal_codes.ensure_counter()
+        print("✅ Счётчик готов")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    run_migration()
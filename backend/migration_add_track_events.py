@@ -0,0 +1,64 @@
+# migration_add_track_events.py
+"""
+Migration: track_events history table.
+Creates the table with its (track_id, ts) index and seeds one event per
+existing track from its current status and location, in batches, so every
+track starts with a history entry.
+Run once: python -m backend.migration_add_track_events
+"""
+
+from sqlalchemy import func, select
+
+from backend.db import SessionLocal, engine
+from backend.models import Track, TrackEvent
+from backend.crud import log_track_events
+
+BATCH_SIZE = 5000
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: История событий треков")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        print("\n1. Таблица track_events...")
+        TrackEvent.__table__.create(bind=engine, checkfirst=True)
+        print("   ✅ Таблица и индекс ix_track_events_track_ts готовы")
+
+        print("\n2. Начальные события для существующих треков...")
+        last_id = 0
+        total = 0
+        while True:
+            upper = db.execute(
+                select(Track.id).where(Track.id > last_id).order_by(Track.id)
+                .offset(BATCH_SIZE - 1).limit(1)
+            ).scalar()
+            if upper is None:
+                upper = db.execute(select(func.max(Track.id))).scalar()
+                if upper is None or upper <= last_id:
+                    break
+            # Tracks that already have events are skipped, so a rerun is harmless
+            log_track_events(db, [
+                Track.id > last_id, Track.id <= upper,
+                ~select(TrackEvent.id).where(TrackEvent.track_id == Track.id).exists()
+            ], "created", note="migration")
+            db.commit()
+            total = db.execute(select(func.count(TrackEvent.id))).scalar()
+            last_id = upper
+            print(f"   ✓ до id {upper}: {total} событий")
+
+        print(f"\n✅ МИГРАЦИЯ ЗАВЕРШЕНА: {total} событий")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
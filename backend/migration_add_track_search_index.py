@@ -0,0 +1,72 @@
+# migration_add_track_search_index.py
+"""
+Migration: reversed track number column for suffix search.
+Adds tracks.track_number_rev with an index and backfills it in batches.
+Run once: python -m backend.migration_add_track_search_index
+"""
+
+from sqlalchemy import inspect, text
+
+from backend.db import SessionLocal, engine
+
+BATCH_SIZE = 1000
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Индекс для поиска по окончанию трек-номера")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        # 1. Column
+        print("\n1. Проверка колонки track_number_rev...")
+        columns = [c["name"] for c in inspect(engine).get_columns("tracks")]
+        if "track_number_rev" not in columns:
+            db.execute(text("ALTER TABLE tracks ADD COLUMN track_number_rev VARCHAR"))
+            db.commit()
+            print("   ✅ Колонка добавлена")
+        else:
+            print("   ✓ Колонка уже существует")
+
+        # 2. Index
+        print("\n2. Индекс ix_tracks_track_number_rev...")
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_tracks_track_number_rev ON tracks (track_number_rev)"))
+        db.commit()
+        print("   ✅ Индекс готов")
+
+        # 3. Backfill in id order, one bounded batch per transaction
+        print("\n3. Заполнение track_number_rev...")
+        last_id = 0
+        total = 0
+        while True:
+            rows = db.execute(text("""
+                SELECT id, track_number FROM tracks
+                WHERE id > :last_id AND track_number_rev IS NULL
+                ORDER BY id LIMIT :limit
+            """), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+
+            db.execute(
+                text("UPDATE tracks SET track_number_rev = :rev WHERE id = :id"),
+                [{"id": row.id, "rev": row.track_number[::-1] if row.track_number else None} for row in rows]
+            )
+            db.commit()
+            last_id = rows[-1].id
+            total += len(rows)
+            print(f"   ✓ {total} треков")
+
+        print(f"\n✅ МИГРАЦИЯ ЗАВЕРШЕНА: обновлено {total} треков")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
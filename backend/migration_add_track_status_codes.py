@@ -0,0 +1,109 @@
+# migration_add_track_status_codes.py
+"""
+Migration: track_statuses reference table and tracks.status_code.
+Creates and seeds track_statuses, maps every distinct tracks.current_status
+text to a code (unknown legacy texts get their own code and are listed),
+backfills status_code in batches, then drops the text column.
+Run once: python -m backend.migration_add_track_status_codes
+"""
+
+from sqlalchemy import func, inspect, text
+
+from backend.db import SessionLocal, engine
+from backend.models import TrackStatus
+from backend import statuses
+
+BATCH_SIZE = 5000
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Коды статусов треков")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        # 1. Reference table
+        print("\n1. Таблица track_statuses...")
+        TrackStatus.__table__.create(bind=engine, checkfirst=True)
+        statuses.seed(db)
+        print(f"   ✅ {len(statuses.all_statuses())} статусов")
+
+        # 2. Column
+        print("\n2. Колонка status_code...")
+        columns = [c["name"] for c in inspect(engine).get_columns("tracks")]
+        if "status_code" not in columns:
+            db.execute(text("ALTER TABLE tracks ADD COLUMN status_code SMALLINT REFERENCES track_statuses (id)"))
+            db.commit()
+            print("   ✓ Добавлена колонка status_code")
+
+        if "current_status" not in columns:
+            print("   Колонка current_status уже удалена, заполнять нечего")
+        else:
+            # 3. Map texts to codes
+            print("\n3. Сопоставление текстов статусов...")
+            texts = [row[0] for row in db.execute(text(
+                "SELECT DISTINCT current_status FROM tracks WHERE status_code IS NULL"
+            ))]
+            mapping = {}
+            for status_text in texts:
+                if status_text is None or not status_text.strip():
+                    mapping[status_text] = statuses.WAITING
+                    continue
+                try:
+                    mapping[status_text] = statuses.code(status_text)
+                except statuses.UnknownStatus:
+                    next_code = (db.query(func.max(TrackStatus.id)).scalar() or 0) + 1
+                    db.add(TrackStatus(id=next_code, name=status_text.strip()))
+                    db.commit()
+                    statuses.load(db)
+                    mapping[status_text] = next_code
+                    print(f"   ⚠️  Новый код {next_code}: '{status_text}' (проверьте, не опечатка ли)")
+            print(f"   ✓ {len(mapping)} различных значений")
+
+            # 4. Backfill, one bounded batch per transaction
+            print("\n4. Заполнение status_code...")
+            total = 0
+            for status_text, code in mapping.items():
+                condition = "current_status IS NULL" if status_text is None else "current_status = :status_text"
+                while True:
+                    result = db.execute(text(f"""
+                        UPDATE tracks SET status_code = :code
+                        WHERE id IN (
+                            SELECT id FROM tracks
+                            WHERE status_code IS NULL AND {condition}
+                            LIMIT :limit
+                        )
+                    """), {"code": code, "status_text": status_text, "limit": BATCH_SIZE})
+                    db.commit()
+                    if not result.rowcount:
+                        break
+                    total += result.rowcount
+                    print(f"   ✓ {total} треков")
+
+            # 5. Drop the text column once every row has a code
+            remaining = db.execute(text("SELECT COUNT(*) FROM tracks WHERE status_code IS NULL")).scalar()
+            if remaining:
+                print(f"\n⚠️  {remaining} треков без кода, колонка current_status оставлена")
+            else:
+                print("\n5. Удаление колонки current_status...")
+                db.execute(text("DROP INDEX IF EXISTS ix_tracks_current_status"))
+                db.execute(text("ALTER TABLE tracks DROP COLUMN current_status"))
+                db.commit()
+                print("   ✓ Колонка удалена")
+
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_tracks_status_code ON tracks (status_code)"))
+        db.commit()
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
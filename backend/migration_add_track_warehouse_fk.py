@@ -0,0 +1,89 @@
+# migration_add_track_warehouse_fk.py
+"""
+Migration: tracks.current_warehouse_id foreign key.
+Adds the column (and current_warehouse for older databases), indexes it and
+backfills it in batches by parsing the free-text current_warehouse values.
+Run once: python -m backend.migration_add_track_warehouse_fk
+"""
+
+from sqlalchemy import inspect, text
+
+from backend.db import SessionLocal, engine
+from backend.models import Warehouse
+from backend.crud import match_warehouse
+
+BATCH_SIZE = 1000
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Склад трека как внешний ключ")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        # 1. Columns
+        print("\n1. Проверка колонок...")
+        columns = [c["name"] for c in inspect(engine).get_columns("tracks")]
+        if "current_warehouse" not in columns:
+            db.execute(text("ALTER TABLE tracks ADD COLUMN current_warehouse VARCHAR(255)"))
+            print("   ✓ Добавлена колонка current_warehouse")
+        if "current_warehouse_id" not in columns:
+            db.execute(text("ALTER TABLE tracks ADD COLUMN current_warehouse_id INTEGER REFERENCES warehouses (id)"))
+            print("   ✓ Добавлена колонка current_warehouse_id")
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_tracks_current_warehouse_id ON tracks (current_warehouse_id)"))
+        db.commit()
+        print("   ✅ Колонки и индекс готовы")
+
+        # 2. Backfill: one bounded batch of rows per transaction
+        print("\n2. Заполнение current_warehouse_id...")
+        warehouses = db.query(Warehouse).all()
+        matched = {}
+        last_id = 0
+        total = 0
+        unmatched = set()
+        while True:
+            rows = db.execute(text("""
+                SELECT id, current_warehouse FROM tracks
+                WHERE id > :last_id AND current_warehouse_id IS NULL
+                  AND current_warehouse IS NOT NULL
+                ORDER BY id LIMIT :limit
+            """), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                if row.current_warehouse not in matched:
+                    matched[row.current_warehouse] = match_warehouse(row.current_warehouse, warehouses)
+                wh = matched[row.current_warehouse]
+                if wh:
+                    updates.append({"id": row.id, "warehouse_id": wh.id})
+                else:
+                    unmatched.add(row.current_warehouse)
+
+            if updates:
+                db.execute(
+                    text("UPDATE tracks SET current_warehouse_id = :warehouse_id WHERE id = :id"),
+                    updates
+                )
+            db.commit()
+            last_id = rows[-1].id
+            total += len(updates)
+            print(f"   ✓ {total} треков")
+
+        print(f"\n✅ МИГРАЦИЯ ЗАВЕРШЕНА: привязано {total} треков")
+        if unmatched:
+            print(f"⚠️  Не распознаны ({len(unmatched)}): {', '.join(sorted(unmatched)[:20])}")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
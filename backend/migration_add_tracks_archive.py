@@ -0,0 +1,60 @@
+# migration_add_tracks_archive.py
+"""
+Migration: tracks_archive cold table.
+Creates tracks_archive, drops the foreign keys that pointed into tracks from
+track_events and warehouse_transfers (archived tracks keep their history)
+and indexes warehouse_transfers.track_number.
+Run once: python -m backend.migration_add_tracks_archive
+Then the first archival: python -m backend.archive
+"""
+
+from sqlalchemy import inspect, text
+
+from backend.db import SessionLocal, engine
+from backend.models import TrackArchive
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Архив выданных треков")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        print("\n1. Таблица tracks_archive...")
+        TrackArchive.__table__.create(bind=engine, checkfirst=True)
+        print("   ✅ Таблица готова")
+
+        print("\n2. Внешние ключи на tracks...")
+        inspector = inspect(engine)
+        if engine.dialect.name == "postgresql":
+            for table in ("track_events", "warehouse_transfers"):
+                if not inspector.has_table(table):
+                    continue
+                for fk in inspector.get_foreign_keys(table):
+                    if fk["referred_table"] == "tracks":
+                        db.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS "{fk["name"]}"'))
+                        print(f"   ✓ {table}: удалён {fk['name']}")
+        else:
+            # SQLite here runs without PRAGMA foreign_keys, the constraints are not enforced
+            print("   SQLite: внешние ключи не проверяются, пропускаем")
+
+        db.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_warehouse_transfers_track_number ON warehouse_transfers (track_number)"
+        ))
+        db.commit()
+        print("   ✅ Индекс ix_warehouse_transfers_track_number готов")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
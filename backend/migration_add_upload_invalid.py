@@ -0,0 +1,42 @@
+# migration_add_upload_invalid.py
+"""
+Migration: uploads.invalid.
+Lines rejected by validation are stored apart from write failures, so a
+re-upload of a manifest whose only failures are bad lines is answered as a
+duplicate instead of being imported again. Older uploads keep invalid = 0.
+Run once: python -m backend.migration_add_upload_invalid
+"""
+
+from sqlalchemy import inspect, text
+
+from backend.db import SessionLocal, engine
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Невалидные строки загрузок")
+    print("=" * 80)
+
+    db = SessionLocal()
+
+    try:
+        print("\n1. Проверка колонки...")
+        columns = [c["name"] for c in inspect(engine).get_columns("uploads")]
+        if "invalid" not in columns:
+            db.execute(text("ALTER TABLE uploads ADD COLUMN invalid INTEGER DEFAULT 0"))
+            db.commit()
+            print("   ✓ Добавлена колонка invalid")
+        print("   ✅ Колонка готова")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
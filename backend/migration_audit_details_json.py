@@ -0,0 +1,128 @@
+# migration_audit_details_json.py
+"""
+Migration: structured audit_logs.details.
+Adds the indexed columns promoted from details (warehouse, warehouse_id,
+track_number, count), converts details to JSONB on Postgres (JSON text on
+SQLite; unparseable legacy text is kept as {"raw": ...}) and backfills
+everything in keyset batches, one transaction per batch.
+Safe to re-run: every pass recomputes the promoted columns.
+Run once: python -m backend.migration_audit_details_json
+"""
+
+import json
+
+from sqlalchemy import inspect, text
+
+from backend.db import SessionLocal, engine
+from backend.models import AuditLog
+from backend.logger import audit_columns
+
+BATCH_SIZE = 2000
+
+NEW_COLUMNS = {
+    "warehouse": "VARCHAR(255)",
+    "warehouse_id": "INTEGER",
+    "track_number": "VARCHAR(255)",
+    "count": "INTEGER",
+}
+INDEXES = ("ix_audit_logs_warehouse_timestamp", "ix_audit_logs_track_number_timestamp")
+
+
+def parse_details(raw):
+    """Legacy details text -> dict (None for empty)."""
+    if raw is None or isinstance(raw, dict):
+        return raw
+    if not str(raw).strip():
+        return None
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return {"raw": raw}
+    return value if isinstance(value, dict) else {"value": value}
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: Структурированные details в audit_logs")
+    print("=" * 80)
+
+    db = SessionLocal()
+    is_postgres = engine.dialect.name == "postgresql"
+
+    try:
+        # 1. Promoted columns
+        print("\n1. Колонки warehouse, warehouse_id, track_number, count...")
+        columns = {c["name"]: c for c in inspect(engine).get_columns("audit_logs")}
+        for name, ddl in NEW_COLUMNS.items():
+            if name not in columns:
+                db.execute(text(f'ALTER TABLE audit_logs ADD COLUMN "{name}" {ddl}'))
+                print(f"   ✓ Добавлена колонка {name}")
+        db.commit()
+
+        # 2. Postgres: text -> jsonb via a side column, swapped in after the backfill
+        target = "details"
+        if is_postgres and "JSON" not in str(columns["details"]["type"]).upper():
+            print("\n2. details -> JSONB...")
+            db.execute(text("ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS details_json JSONB"))
+            db.commit()
+            target = "details_json"
+
+        # 3. Backfill in keyset batches
+        print("\n3. Заполнение...")
+        details_sql = "details::text" if is_postgres else "details"
+        last_id = 0
+        total = 0
+        while True:
+            rows = db.execute(text(f"""
+                SELECT id, target_entity, target_id, {details_sql} AS details
+                FROM audit_logs WHERE id > :last_id ORDER BY id LIMIT :limit
+            """), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                details = parse_details(row.details)
+                values = audit_columns(db, row.target_entity, row.target_id, details)
+                values["id"] = row.id
+                values["details"] = json.dumps(details, ensure_ascii=False) if details is not None else None
+                params.append(values)
+
+            details_value = "CAST(:details AS JSONB)" if is_postgres else ":details"
+            db.execute(text(f"""
+                UPDATE audit_logs
+                SET {target} = {details_value}, warehouse = :warehouse, warehouse_id = :warehouse_id,
+                    track_number = :track_number, "count" = :count
+                WHERE id = :id
+            """), params)
+            db.commit()
+
+            last_id = rows[-1].id
+            total += len(rows)
+            print(f"   ✓ {total} записей")
+
+        if target == "details_json":
+            db.execute(text("ALTER TABLE audit_logs DROP COLUMN details"))
+            db.execute(text("ALTER TABLE audit_logs RENAME COLUMN details_json TO details"))
+            db.commit()
+            print("   ✓ details теперь JSONB")
+
+        # 4. Indexes
+        print("\n4. Индексы...")
+        for index in AuditLog.__table__.indexes:
+            if index.name in INDEXES:
+                index.create(bind=engine, checkfirst=True)
+                print(f"   ✓ {index.name}")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_migration()
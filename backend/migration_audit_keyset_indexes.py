@@ -0,0 +1,42 @@
+# migration_audit_keyset_indexes.py
+"""
+Migration: append id to the audit_logs timestamp indexes.
+Keyset pagination orders by (timestamp DESC, id DESC); with id in the index
+Postgres walks it without a sort. (SQLite already keys every index by rowid,
+rebuilding there is harmless.)
+Drops and recreates the audit_logs (…, timestamp, id) indexes from models.py.
+Run once: python -m backend.migration_audit_keyset_indexes
+Check plans afterwards: python -m backend.check_query_plans
+"""
+
+from sqlalchemy import text
+
+from backend.db import engine
+from backend.models import AuditLog
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: id в индексах audit_logs (keyset-пагинация)")
+    print("=" * 80)
+
+    try:
+        for index in AuditLog.__table__.indexes:
+            names = [column.name for column in index.columns]
+            if names[-2:] != ["timestamp", "id"]:
+                continue
+            columns = ", ".join(names)
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+                index.create(bind=conn)
+            print(f"   ✓ {index.name} ({columns})")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    run_migration()
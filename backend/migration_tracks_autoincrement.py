@@ -0,0 +1,70 @@
+# migration_tracks_autoincrement.py
+"""
+Migration: never reuse tracks ids on SQLite.
+Without AUTOINCREMENT SQLite gives a new track the id of the deleted max-id
+row, i.e. of a track just moved to tracks_archive: archiving the new one then
+fails on tracks_archive.id and the old track's track_events show up on it.
+SQLite cannot add AUTOINCREMENT to a table, so tracks is rebuilt (copy, drop,
+rename, recreate indexes) and the sequence starts above every id in tracks and
+tracks_archive. Postgres sequences never go back, nothing to do there.
+Run once, with the app stopped: python -m backend.migration_tracks_autoincrement
+"""
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable
+
+from backend.db import engine
+from backend.models import Track, TrackArchive
+
+
+def needs_rebuild(conn) -> bool:
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tracks'")).scalar()
+    return bool(sql) and "AUTOINCREMENT" not in sql.upper()
+
+
+def run_migration():
+    print("=" * 80)
+    print("МИГРАЦИЯ: AUTOINCREMENT для tracks")
+    print("=" * 80)
+
+    if engine.dialect.name != "sqlite":
+        print("   PostgreSQL: id из последовательности не переиспользуются, пропускаем")
+        return
+
+    try:
+        with engine.begin() as conn:
+            TrackArchive.__table__.create(bind=conn, checkfirst=True)
+            if needs_rebuild(conn):
+                print("\n1. Пересоздание tracks...")
+                create = str(CreateTable(Track.__table__).compile(dialect=engine.dialect))
+                conn.execute(text(create.replace("CREATE TABLE tracks ", "CREATE TABLE tracks_new ", 1)))
+                columns = ", ".join(column.name for column in Track.__table__.columns)
+                copied = conn.execute(text(f"INSERT INTO tracks_new ({columns}) SELECT {columns} FROM tracks")).rowcount
+                conn.execute(text("DROP TABLE tracks"))
+                conn.execute(text("ALTER TABLE tracks_new RENAME TO tracks"))
+                for index in Track.__table__.indexes:
+                    index.create(bind=conn)
+                print(f"   ✓ Скопировано треков: {copied}")
+            else:
+                print("\n1. tracks уже с AUTOINCREMENT")
+
+            print("\n2. Последовательность id...")
+            top = conn.execute(text(
+                "SELECT max(coalesce((SELECT max(id) FROM tracks), 0), coalesce((SELECT max(id) FROM tracks_archive), 0))"
+            )).scalar()
+            seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'tracks'")).scalar()
+            if seq is None:
+                conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tracks', :seq)"), {"seq": top})
+            elif seq < top:
+                conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'tracks'"), {"seq": top})
+            print(f"   ✓ Новые id начнутся после {max(top, seq or 0)}")
+
+        print("\n✅ МИГРАЦИЯ ЗАВЕРШЕНА")
+
+    except Exception as e:
+        print(f"\n❌ ОШИБКА МИГРАЦИИ: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    run_migration()
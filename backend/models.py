@@ -1,8 +1,11 @@
 # backend/models.py
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, Date, DateTime, Text, ForeignKey, Index, JSON, event, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
+from . import statuses
 
 class User(Base):
     __tablename__ = "users"
@@ -26,6 +29,14 @@ class User(Base):
     assigned_warehouse = Column(String(255), nullable=True)  # "РљРёС‚Р°Р№", "РђР»РјР°С‚С‹", "РЁС‹РјРєРµРЅС‚" etc
 
 
+class PersonalCodeCounter(Base):
+    """Single-row counter for personal codes on SQLite (Postgres uses a sequence)."""
+    __tablename__ = "personal_code_counter"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # always 1
+    next_value = Column(Integer, nullable=False)  # next code to hand out
+
+
 class Warehouse(Base):
     __tablename__ = "warehouses"
 
@@ -41,17 +52,36 @@ class Warehouse(Base):
 
 
 
+class TrackStatus(Base):
+    __tablename__ = "track_statuses"
+
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)  # codes in backend/statuses.py
+    name = Column(String(255), unique=True, nullable=False)
+
+
 class Track(Base):
     __tablename__ = "tracks"
+    __table_args__ = (
+        Index("ix_tracks_personal_code_active", "personal_code", "is_active"),  # client portal
+        Index("ix_tracks_created_at", "created_at"),                            # /api/tracks/all
+        # SQLite would otherwise hand out the id of a deleted (archived) max-id
+        # row again, colliding with tracks_archive.id and its track_events
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True)
     track_number = Column(String, unique=True, index=True)
+    track_number_rev = Column(String, index=True)  # reversed number, serves suffix search
     personal_code = Column(String, index=True)
     notes = Column(Text)
-    current_status = Column(String, default="Ожидание обновления")
+    status_code = Column(SmallInteger, ForeignKey('track_statuses.id'), default=statuses.WAITING, index=True)  # stats counters
+    
+    # Location: FK for filtering, text label ("Name (CODE)") for display
+    current_warehouse_id = Column(Integer, ForeignKey('warehouses.id'), nullable=True, index=True)
+    current_warehouse = Column(String(255), nullable=True)
     
     china_arrival = Column(DateTime)
-    china_departure = Column(DateTime)
+    china_departure = Column(DateTime, index=True)
     kz_arrival = Column(DateTime)
     handout_date = Column(DateTime)
     
@@ -59,6 +89,74 @@ class Track(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @hybrid_property
+    def current_status(self):
+        """Display text of status_code."""
+        return statuses.name(self.status_code)
+
+    @current_status.setter
+    def current_status(self, text):
+        self.status_code = statuses.code(text)
+
+    @current_status.expression
+    def current_status(cls):
+        # SQL side for ad-hoc queries; hot paths filter on status_code directly
+        return select(TrackStatus.name).where(TrackStatus.id == cls.status_code).scalar_subquery()
+
+
+@event.listens_for(Track, "before_insert")
+@event.listens_for(Track, "before_update")
+def _set_track_number_rev(mapper, connection, target):
+    # Bulk Core inserts in crud set the column themselves
+    target.track_number_rev = target.track_number[::-1] if target.track_number else None
+
+
+
+class TrackArchive(Base):
+    """
+    Cold storage for handed-out tracks (see backend/archive.py).
+    Same columns as tracks, keeps the original id so track_events still match
+    (tracks ids are never reused: AUTOINCREMENT on SQLite, a sequence on Postgres).
+    """
+    __tablename__ = "tracks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    track_number = Column(String, index=True)  # not unique: a number can be reused after archival
+    track_number_rev = Column(String)
+    personal_code = Column(String, index=True)
+    notes = Column(Text)
+    status_code = Column(SmallInteger)
+    current_warehouse_id = Column(Integer)
+    current_warehouse = Column(String(255))
+    china_arrival = Column(DateTime)
+    china_departure = Column(DateTime)
+    kz_arrival = Column(DateTime)
+    handout_date = Column(DateTime)
+    is_active = Column(Boolean)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def current_status(self):
+        return statuses.name(self.status_code)
+
+
+class TrackEvent(Base):
+    """Append-only history of a track: one row per status or location change."""
+    __tablename__ = "track_events"
+    __table_args__ = (
+        Index("ix_track_events_track_ts", "track_id", "ts"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    track_id = Column(Integer, nullable=False)  # tracks.id or tracks_archive.id, no FK so history survives archival
+    ts = Column(DateTime, default=datetime.utcnow, nullable=False)
+    kind = Column(String(20), nullable=False)  # statuses.EVENT_KINDS
+    status_code = Column(SmallInteger, ForeignKey('track_statuses.id'), nullable=True)
+    warehouse_id = Column(Integer, ForeignKey('warehouses.id'), nullable=True)
+    performed_by = Column(String(255), nullable=True)
+    note = Column(String(255), nullable=True)
 
 
 class WarehouseTransfer(Base):
@@ -66,7 +164,7 @@ class WarehouseTransfer(Base):
     __table_args__ = {"extend_existing": True}
     
     id = Column(Integer, primary_key=True, index=True)
-    track_number = Column(String(255), ForeignKey('tracks.track_number'), nullable=False)
+    track_number = Column(String(255), nullable=False, index=True)  # no FK: the track may be archived
     from_warehouse = Column(String(255), nullable=False)
     to_warehouse = Column(String(255), nullable=False)
     transfer_date = Column(DateTime, default=datetime.utcnow)
@@ -76,13 +174,59 @@ class WarehouseTransfer(Base):
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        # id is the keyset tie-breaker: ORDER BY timestamp DESC, id DESC walks these without a sort
+        Index("ix_audit_logs_timestamp", "timestamp", "id"),
+        Index("ix_audit_logs_action_timestamp", "action", "timestamp", "id"),
+        Index("ix_audit_logs_performed_by_timestamp", "performed_by", "timestamp", "id"),
+        Index("ix_audit_logs_target_timestamp", "target_entity", "target_id", "timestamp", "id"),
+        Index("ix_audit_logs_warehouse_timestamp", "warehouse_id", "timestamp", "id"),
+        Index("ix_audit_logs_track_number_timestamp", "track_number", "timestamp", "id"),
+        {"extend_existing": True}
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     action = Column(String(255), nullable=False)
     performed_by = Column(String(255), nullable=False)
     target_entity = Column(String(100), nullable=True)
     target_id = Column(String(255), nullable=True)
-    details = Column(Text, nullable=True)
+    details = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     ip_address = Column(String(50), nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+    # Promoted from details at write time (logger.audit_columns) so filters hit an index
+    warehouse = Column(String(255), nullable=True)      # warehouse/branch text as logged
+    warehouse_id = Column(Integer, nullable=True)       # resolved warehouses.id
+    track_number = Column(String(255), nullable=True)
+    count = Column(Integer, nullable=True)
+
+
+class AuditDailyStat(Base):
+    """Audit entries per (day, action, user), bumped in the same transaction as the audit_logs insert."""
+    __tablename__ = "audit_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    action = Column(String(255), primary_key=True)
+    performed_by = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Upload(Base):
+    __tablename__ = "uploads"
+    __table_args__ = {"extend_existing": True}
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)  # sha256(file + date + status)
+    filename = Column(String(255))
+    track_status = Column(String(255))
+    departure_date = Column(Date)
+    uploaded_by = Column(String(255))
+    job_id = Column(String(64), nullable=True)
+    state = Column(String(20), default="running")  # running, done, failed
+    created = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    unchanged = Column(Integer, default=0)
+    failed = Column(Integer, default=0)   # includes `invalid`
+    invalid = Column(Integer, default=0)  # lines rejected by validation, the same on every re-upload
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,137 @@
+# backend/personal_codes.py
+"""
+Personal code allocation.
+
+Codes come from a PostgreSQL sequence (personal_code_seq) or, on SQLite,
+from the single row of personal_code_counter bumped in one short
+transaction. Either way a code is never handed out twice and nothing scans
+users. Reservations commit on a pooled connection of their own (see
+db.py), so concurrent registrations don't wait on each other's user
+inserts and a caller's pending insert is neither committed nor rolled back
+with them. Callers reserve before their first write: on SQLite a session
+already holding the write lock would block its own reservation until
+busy_timeout. On an in-memory database (db.SHARED_CONNECTION) there is only
+one connection, and a reservation commits whatever the caller has flushed.
+
+Each process keeps a small block of reserved codes (PERSONAL_CODE_BLOCK_SIZE,
+default 1 = strictly sequential). Bulk imports reserve exactly what they
+need with allocate(n). Codes of an unused block are skipped after a restart.
+"""
+
+import os
+import threading
+
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import IntegrityError
+
+from backend import db
+from backend.models import PersonalCodeCounter
+
+BLOCK_SIZE = max(1, int(os.getenv("PERSONAL_CODE_BLOCK_SIZE", "1")))
+SEQUENCE = "personal_code_seq"
+
+_lock = threading.Lock()
+_block = []  # reserved but not yet handed out, in ascending order
+_ready = False
+
+
+def _is_postgres(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _max_numeric_code(conn) -> int:
+    """Largest all-digit personal code in users (0 if none). Only used to seed the counter."""
+    if _is_postgres(conn.engine):
+        sql = "SELECT MAX(CAST(personal_code AS BIGINT)) FROM users WHERE personal_code ~ '^[0-9]+$'"
+    else:
+        sql = ("SELECT MAX(CAST(personal_code AS INTEGER)) FROM users "
+               "WHERE personal_code != '' AND personal_code NOT GLOB '*[^0-9]*'")
+    return conn.execute(text(sql)).scalar() or 0
+
+
+def ensure_counter(engine=None):
+    """Create and seed the sequence / counter row if missing. Safe to call from every worker."""
+    global _ready
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        if _is_postgres(engine):
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": SEQUENCE}).scalar()
+            if not exists:
+                start = _max_numeric_code(conn) + 1
+                conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} START WITH {int(start)}"))
+        else:
+            PersonalCodeCounter.__table__.create(bind=conn, checkfirst=True)
+            row = conn.execute(select(PersonalCodeCounter.next_value).where(PersonalCodeCounter.id == 1)).scalar()
+            if row is None:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(PersonalCodeCounter.__table__.insert().values(
+                            id=1, next_value=_max_numeric_code(conn) + 1
+                        ))
+                except IntegrityError:
+                    pass  # another worker seeded it first
+    _ready = True
+
+
+def reserve(n: int) -> list:
+    """Reserve `n` fresh codes in the database with one round trip. Returns ints."""
+    if not _ready:
+        ensure_counter()
+    engine = db.engine
+    with engine.begin() as conn:
+        if _is_postgres(engine):
+            return list(conn.execute(
+                text(f"SELECT nextval('{SEQUENCE}') FROM generate_series(1, :n)"), {"n": n}
+            ).scalars())
+        # The UPDATE takes SQLite's write lock, so the read below sees our own bump
+        conn.execute(
+            update(PersonalCodeCounter)
+            .where(PersonalCodeCounter.id == 1)
+            .values(next_value=PersonalCodeCounter.next_value + n)
+        )
+        end = conn.execute(select(PersonalCodeCounter.next_value).where(PersonalCodeCounter.id == 1)).scalar()
+        return list(range(end - n, end))
+
+
+def next_code() -> str:
+    """One personal code, from the in-process block (refilled BLOCK_SIZE at a time)."""
+    with _lock:
+        if not _block:
+            _block.extend(reserve(BLOCK_SIZE))
+        return str(_block.pop(0))
+
+
+def allocate(n: int) -> list:
+    """`n` personal codes for a bulk import, reserved in one step."""
+    if n <= 0:
+        return []
+    return [str(code) for code in reserve(n)]
+
+
+def bump_past(code):
+    """
+    Make sure the allocator never hands out `code` (an all-digit code that
+    was assigned by hand). Non-numeric codes are ignored.
+    """
+    code = str(code or "").strip()
+    if not code.isdigit():
+        return
+    value = int(code)
+    if not _ready:
+        ensure_counter()
+    engine = db.engine
+    with engine.begin() as conn:
+        if _is_postgres(engine):
+            conn.execute(
+                text(f"SELECT setval('{SEQUENCE}', :v) WHERE :v >= (SELECT last_value FROM {SEQUENCE})"),
+                {"v": value}
+            )
+        else:
+            conn.execute(
+                update(PersonalCodeCounter)
+                .where(PersonalCodeCounter.id == 1, PersonalCodeCounter.next_value <= value)
+                .values(next_value=value + 1)
+            )
+    with _lock:
+        if value in _block:
+            _block.remove(value)
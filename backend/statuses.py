@@ -0,0 +1,110 @@
+# backend/statuses.py
+"""
+Track status reference data.
+
+Tracks store a small integer `status_code` (FK to track_statuses); the text
+is resolved here from an in-process map, so counters group by an indexed
+integer and a mistyped status is rejected instead of becoming a new category.
+"""
+
+import threading
+
+# Fixed codes. New statuses are appended, codes are never reused.
+WAITING = 1
+LEFT_CHINA = 2
+IN_TRANSIT_WAREHOUSE = 3
+AT_WAREHOUSE = 4
+DELIVERED = 5
+REGISTERED_BY_CLIENT = 6
+IN_CHINA = 7
+
+DEFAULT_STATUSES = {
+    WAITING: "Ожидание обновления",
+    LEFT_CHINA: "Выехал из склада Китая",
+    IN_TRANSIT_WAREHOUSE: "В транзитном складе",
+    AT_WAREHOUSE: "На складе",
+    DELIVERED: "Выдан клиенту",
+    REGISTERED_BY_CLIENT: "Дата регистрации клиентом",
+    IN_CHINA: "В Китае",
+}
+
+# track_events.kind: what wrote the event (the status and warehouse it
+# records are in their own columns)
+EVENT_CREATED = "created"     # track added (admin, client, import)
+EVENT_UPLOAD = "upload"       # manifest upsert changed the row
+EVENT_BATCH = "batch"         # batch status update, bulk-by-warehouse
+EVENT_HANDOUT = "handout"     # handed out to the client (note: recipient)
+EVENT_RECEIVE = "receive"     # received at a warehouse
+EVENT_TRANSFER = "transfer"   # moved between warehouses (note: from → to)
+EVENT_UPDATE = "update"       # single-track edit
+
+EVENT_KINDS = (
+    EVENT_CREATED, EVENT_UPLOAD, EVENT_BATCH, EVENT_HANDOUT,
+    EVENT_RECEIVE, EVENT_TRANSFER, EVENT_UPDATE,
+)
+
+_names = dict(DEFAULT_STATUSES)
+_codes = {text.lower(): code for code, text in _names.items()}
+_loaded = False
+_lock = threading.Lock()
+
+
+class UnknownStatus(ValueError):
+    pass
+
+
+def load(db=None):
+    """(Re)load the map from track_statuses, e.g. rows added by the migration."""
+    global _loaded
+    from backend import models
+    from backend.db import SessionLocal
+
+    session = db or SessionLocal()
+    try:
+        rows = session.query(models.TrackStatus.id, models.TrackStatus.name).all()
+    finally:
+        if db is None:
+            session.close()
+    with _lock:
+        for code, text in rows:
+            _names[code] = text
+            _codes[text.lower()] = code
+        _loaded = True
+
+
+def seed(db):
+    """Insert the default statuses that are missing from track_statuses."""
+    from backend import models
+    existing = {code for (code,) in db.query(models.TrackStatus.id).all()}
+    for code, text in DEFAULT_STATUSES.items():
+        if code not in existing:
+            db.add(models.TrackStatus(id=code, name=text))
+    db.commit()
+    load(db)
+
+
+def code(text: str) -> int:
+    """Status code for a display text (case-insensitive). Raises UnknownStatus."""
+    key = (text or "").strip().lower()
+    if key not in _codes and not _loaded:
+        load()
+    try:
+        return _codes[key]
+    except KeyError:
+        raise UnknownStatus(f"Unknown status: {text}")
+
+
+def name(status_code) -> str:
+    """Display text for a status code (None for a track without one)."""
+    if status_code is None:
+        return None
+    if status_code not in _names and not _loaded:
+        load()
+    return _names.get(status_code, str(status_code))
+
+
+def all_statuses() -> list:
+    """[{code, name}] ordered by code, for status pickers."""
+    if not _loaded:
+        load()
+    return [{"code": c, "name": n} for c, n in sorted(_names.items())]
@@ -181,6 +181,19 @@ async function showDateTracks(date) {
 			}
 
 
+// ===== Фоновый импорт треков =====
+// Загрузка возвращает job_id сразу, прогресс опрашиваем через /api/jobs/{id}
+async function waitForImportJob(jobId, onProgress) {
+  while (true) {
+    const job = await authFetch(`/api/jobs/${jobId}`);
+    if (onProgress) onProgress(job);
+    if (job.status === 'done') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Импорт не удался');
+    await new Promise(resolve => setTimeout(resolve, 1000));
+  }
+}
+
+
 // ===== Пользователи: удалить / активировать =====
 window.deleteUser = async function(userId) {
   if (!confirm('Удалить пользователя?')) return;
@@ -447,8 +460,15 @@ document.addEventListener('DOMContentLoaded', async () => {
         uploadBtn.innerHTML = 'Загрузка...';
 
         try {
-          const result = await authFetch('/api/tracks/upload', { method: 'POST', body: formData });
-          alert(`✅ Загружено: ${result.imported || result.count || 0}`);
+          const upload = await authFetch('/api/tracks/upload', { method: 'POST', body: formData });
+          if (upload.duplicate && !upload.job_id) {
+            alert(`ℹ️ Этот файл уже загружен ${upload.uploaded_by || ''} — изменений нет`);
+          } else {
+            const job = await waitForImportJob(upload.job_id, (j) => {
+              uploadBtn.innerHTML = `Загрузка... ${j.processed} (${j.rows_per_second}/с)`;
+            });
+            alert(`✅ Загружено: ${job.created + job.updated} (новых: ${job.created}, обновлено: ${job.updated}, без изменений: ${job.unchanged}, ошибок: ${job.failed})`);
+          }
           document.getElementById('tracks-file').value = '';
           document.getElementById('china-date').value = '';
           document.getElementById('track-status-select').value = '';
@@ -5,7 +5,7 @@ async function authFetch(url, options = {}) {
     return fetch(url, options);
 }
 
-let currentPage = 0;
+let nextCursor = null;  // X-Next-Cursor of the last page, null when there are no more
 const pageSize = 100;
 let allLogs = [];
 
@@ -42,13 +42,12 @@ document.addEventListener('DOMContentLoaded', async () => {
     await loadLogs();
 
     document.getElementById('apply-filters')?.addEventListener('click', () => {
-        currentPage = 0;
+        nextCursor = null;
         loadLogs();
     });
 
     document.getElementById('load-more')?.addEventListener('click', () => {
-        currentPage++;
-        loadLogs(true);
+        if (nextCursor) loadLogs(true);
     });
 
     document.querySelector('.logout')?.addEventListener('click', (e) => {
@@ -93,15 +92,19 @@ async function loadLogs(append = false) {
     if (user) params.append('user', user);
     if (warehouse) params.append('warehouse', warehouse);
     params.append('limit', pageSize);
-    params.append('offset', currentPage * pageSize);
+    if (append && nextCursor) params.append('cursor', nextCursor);
 
     try {
         const res = await authFetch(`/api/audit/logs?${params.toString()}`);
         if (!res.ok) throw new Error('Failed');
 
         const logs = await res.json();
+        nextCursor = res.headers.get('X-Next-Cursor');
         console.log('✅ Logs loaded:', logs.length);
 
+        const loadMore = document.getElementById('load-more');
+        if (loadMore) loadMore.style.display = nextCursor ? '' : 'none';
+
         if (!append) {
             allLogs = logs;
         } else {
@@ -139,7 +142,7 @@ function renderLogs() {
         let detailsHtml = '-';
         if (log.details) {
             try {
-                const details = JSON.parse(log.details);
+                const details = typeof log.details === 'string' ? JSON.parse(log.details) : log.details;
                 const parts = [];
                 
                 // LOGIN_SUCCESS
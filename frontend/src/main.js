@@ -84,6 +84,18 @@ function renderTrackCard(track, isSearchResult = false) {
         .map(item => renderStatusItem(item))
         .join('');
 
+    // Full event history comes with the track, no extra request per card
+    const history = track.history || [];
+    const historyHTML = history.length
+        ? `<details class="track-history">
+               <summary>История (${history.length})</summary>
+               ${history.map(item => renderStatusItem({
+                   ...item,
+                   status: item.warehouse ? `${item.status} · ${item.warehouse}` : item.status
+               })).join('')}
+           </details>`
+        : '';
+
     return `
         <div class="track-card" id="track-${track.track_number}">
             <div class="${headerClass}">
@@ -96,6 +108,7 @@ function renderTrackCard(track, isSearchResult = false) {
                     Текущий статус: <strong>${track.current_status || 'Ожидание обновления'}</strong>
                 </div>
                 ${timelineHTML}
+                ${historyHTML}
             </div>
         </div>
     `;
@@ -227,6 +240,36 @@ async function handleSubmitTrack() {
 
 
 // === SEARCH FUNCTIONS ===
+// Несколько номеров (через пробел, запятую или с новой строки) ищем одним запросом
+async function handleMultiTrackSearch(trackNumbers) {
+    SEARCH_RESULT_CONTAINER.innerHTML = `<p class="no-tracks-text">🔍 Ищу ${trackNumbers.length} треков...</p>`;
+    USER_PARCELS_CARD.style.display = 'none';
+    SEARCH_RESULT_CARD.style.display = 'block';
+
+    try {
+        const res = await authFetch('/api/tracks/lookup', {
+            method: 'POST',
+            body: JSON.stringify({ track_numbers: trackNumbers })
+        });
+        const data = await res.json();
+
+        if (!res.ok) {
+            SEARCH_RESULT_CONTAINER.innerHTML = `<p class="text-danger">Ошибка сервера: ${data.detail || "Неизвестная ошибка."}</p>`;
+            return;
+        }
+
+        const notFound = data.not_found.length
+            ? `<p class="alert alert-info text-center">
+                   Не найдены: <strong>${data.not_found.join(', ')}</strong>
+               </p>`
+            : '';
+        SEARCH_RESULT_CONTAINER.innerHTML = data.found.map(t => renderTrackCard(t, true)).join('') + notFound;
+    } catch (error) {
+        console.error("Ошибка сети при поиске:", error);
+        SEARCH_RESULT_CONTAINER.innerHTML = `<p class="text-danger">❌ Ошибка сети при поиске.</p>`;
+    }
+}
+
 async function handleTrackSearch(trackNumber) {
     if (!trackNumber) {
         USER_PARCELS_CARD.style.display = 'block';
@@ -234,6 +277,11 @@ async function handleTrackSearch(trackNumber) {
         return;
     }
 
+    const trackNumbers = trackNumber.toUpperCase().split(/[\s,;]+/).filter(Boolean);
+    if (trackNumbers.length > 1) {
+        return handleMultiTrackSearch(trackNumbers);
+    }
+
     SEARCH_RESULT_CONTAINER.innerHTML = `<p class="no-tracks-text">🔍 Ищу трек ${trackNumber}...</p>`;
     USER_PARCELS_CARD.style.display = 'none';
     SEARCH_RESULT_CARD.style.display = 'block';